@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the cached data header parser :func:`pyilt2._parseHeader` (no network)::
+
+    $ python benchmarks/bench_header.py [dataSets]
+
+It runs :meth:`pyilt2.dataset._dataHeader` for 20000 synthetic data sets with a few distinct headers,
+as in the database, once with the cache and once with the undecorated parser, and reports the best time of each.
+Each data set has its own freshly JSON-decoded header, so the timings include building and hashing the cache keys.
+"""
+
+import json
+import os
+import sys
+import timeit
+
+# benchmark the working copy, not an installed version
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pyilt2  # noqa: E402
+
+headers = [
+    ([['Temperature, K'], ['Pressure, kPa'], ['Specific density, kg/m<SUP>3</SUP>', 'Liquid']], [1, 1, 2]),
+    ([['Temperature, K'], ['Viscosity, Pa&#8226;s', 'Liquid']], [1, 2]),
+    ([['Mole fraction of water', 'Liquid'], ['Temperature, K'], ['Pressure, kPa'],
+      ['Speed of sound, m/s', 'Liquid']], [2, 1, 1, 2]),
+    ([['Temperature, K'], ['Pressure, kPa'], ['Electrical conductivity, S/m', 'Liquid']], [1, 1, 2]),
+]
+
+
+def makeDataSets(dataSets):
+    """
+    Returns *dataSets* bare :class:`pyilt2.dataset` objects with the header of a decoded JSON response
+    and the number of values per column, as needed by :meth:`pyilt2.dataset._dataHeader`.
+    """
+    out = []
+    for i in range(dataSets):
+        dhead, incol = headers[i % len(headers)]
+        ds = pyilt2.dataset.__new__(pyilt2.dataset)
+        ds.setid = 'S{0:05d}'.format(i)
+        ds.setDict = {'dhead': json.loads(json.dumps(dhead))}
+        ds._incol = list(incol)
+        out.append(ds)
+    return out
+
+
+def main(dataSets=20000, repeat=5):
+    cached = pyilt2._parseHeader
+    uncached = cached.__wrapped__
+
+    def run(parse):
+        # new data sets for each run, so no key tuple (and its hash) is reused
+        sets = makeDataSets(dataSets)
+        pyilt2._parseHeader = parse
+        cached.cache_clear()
+        start = timeit.default_timer()
+        for ds in sets:
+            ds._dataHeader()
+        return timeit.default_timer() - start
+
+    print('{0:d} data sets with {1:d} distinct headers, best of {2:d}:'.format(dataSets, len(headers), repeat))
+    try:
+        for name, parse in (('cached', cached), ('uncached', uncached)):
+            best = min(run(parse) for i in range(repeat))
+            print('  {0:10s} {1:8.1f} ms'.format(name, best * 1e3))
+            if parse is cached:
+                print('  {0:10s} {1}'.format('', cached.cache_info()))
+    finally:
+        pyilt2._parseHeader = cached
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark of :class:`pyilt2.result` with a synthetic search result of 50000 hits (no network)::
+
+    $ python benchmarks/bench_result.py [hits]
+
+It reports the best time of constructing the result object, of reading the setid and number of components
+of all references, and of building all ``refDict``.
+"""
+
+import os
+import sys
+import timeit
+
+# benchmark the working copy, not an installed version
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pyilt2  # noqa: E402
+
+header = ['setid', 'ref', 'prp', 'phmask', 'np', 'nm1', 'nm2', 'nm3', 'lnm1', 'lnm2', 'lnm3']
+
+
+def makeResDict(hits):
+    """Returns a synthetic ``resDict`` with *hits* rows (binary mixtures every other row)."""
+    rows = [['S{0:05d}'.format(i), 'Muster et al. (2018)', 'Density', '', str(i % 90 + 1),
+             '1-butyl-3-methylimidazolium hexafluorophosphate', 'water' if i % 2 else '', '', '', '', '']
+            for i in range(hits)]
+    return {'errors': [], 'header': header, 'res': rows}
+
+
+def main(hits=50000, repeat=5):
+    resDict = makeResDict(hits)
+    cases = [
+        ('construct', lambda: pyilt2.result(resDict)),
+        ('setid + numOfComp', lambda: [(ref.setid, ref.numOfComp) for ref in pyilt2.result(resDict)]),
+        ('refDict', lambda: [ref.refDict for ref in pyilt2.result(resDict)]),
+    ]
+    print('{0:d} hits, best of {1:d}:'.format(hits, repeat))
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print('  {0:20s} {1:8.1f} ms'.format(name, best * 1e3))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
@@ -69,10 +69,15 @@ Classes & Functions
 ---------------------
 """
 
-import requests
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
 from .proplist import prop2abr, abr2prop, abr2key, properties
+from . import units
+from . import mixture
+from . import web
 from .version import __version__
 
 __license__ = "MIT"
@@ -81,6 +86,12 @@ __docformat__ = 'reStructuredText'
 searchUrl = "http://ilthermo.boulder.nist.gov/ILT2/ilsearch"
 dataUrl = "http://ilthermo.boulder.nist.gov/ILT2/ilset"
 
+#: shared :class:`requests.Session` of the HTTP layer :mod:`pyilt2.web`
+session = web.session
+
+#: optional in-process cache (:class:`pyilt2.cache.datasetCache`) used by :meth:`pyilt2.reference.get`
+dataCache = None
+
 
 def query(comp='', numOfComp=0, year='', author='', keywords='', prop=''):
     """ Starts a query on the Ionic Liquids Database from NIST.
@@ -127,7 +138,7 @@ def query(comp='', numOfComp=0, year='', author='', keywords='', prop=''):
         prp=prp
     )
     #print(params)
-    r = requests.get(searchUrl, params=params)
+    r = web.get(searchUrl, params=params)
     resDict = r.json()
     #print(resDict)
     if len(resDict['errors']) > 0:
@@ -136,6 +147,52 @@ def query(comp='', numOfComp=0, year='', author='', keywords='', prop=''):
     return result(resDict)
 
 
+def multiQuery(comps, props, numOfComp=0, year='', author='', keywords='', workers=8):
+    """ Starts a query for each combination of component and physical property concurrently
+    and merges the hits into one :class:`pyilt2.multiResult` object, where each data set appears only once.
+
+    .. code-block:: py
+
+        res = pyilt2.multiQuery(['[C4mim][PF6]', '[C2mim][SCN]'], ['dens', 'visc'])
+        for ref in res.refs:
+            print(ref.setid, ref.queries)   # e.g. [('[C4mim][PF6]', 'dens')]
+
+    :param comps: components, each like *comp* of :func:`query` (use ``['']`` for *any*)
+    :type comps: list
+    :param props: physical properties, each like *prop* of :func:`query` (use ``['']`` for *unspecified*)
+    :type props: list
+    :param numOfComp: Number of mixture components. Default '0' means *any* number.
+    :type numOfComp: int
+    :param year: Publication year
+    :type year: str
+    :param author: Author's last name
+    :type author: str
+    :param keywords: Keyword(s)
+    :type keywords: str
+    :param workers: maximum number of concurrent queries
+    :type workers: int
+    :return: merged result object; failed queries are listed in its :attr:`~pyilt2.multiResult.errors`
+    :rtype: :class:`pyilt2.multiResult`
+    """
+    subQueries = [(comp, prop) for comp in comps for prop in props]
+    prio = web.currentPriority()
+
+    def _query(comp, prop):
+        with web.priority(*prio):
+            return query(comp=comp, numOfComp=numOfComp, year=year, author=author, keywords=keywords, prop=prop)
+
+    out = multiResult()
+    web.setPoolSize(workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_query, comp, prop) for comp, prop in subQueries]
+        for subQuery, future in zip(subQueries, futures):
+            try:
+                out.merge(future.result(), subQuery)
+            except (queryError, ValueError, IOError) as e:
+                out.errors[subQuery] = e
+    return out
+
+
 class result(object):
     """ Class to store query results.
 
@@ -160,37 +217,67 @@ class result(object):
     """
 
     def __init__(self, resDict):
-        self._currentRefIndex = 0
         #: original JSON object from NIST server decoded to a Python dictionary (:doc:`example <resdict>`)
         self.resDict = resDict
-        # create reference objects
-        self.refs = []
-        for ref in self.resDict['res']:
-            ref = self._makeRefDict(ref)
-            self.refs.append(reference(ref))
+        # create reference objects, which share the map of column name to index
+        index = {name: i for i, name in enumerate(self.resDict['header'])}
+        compCols = tuple(index[k] for k in ('nm1', 'nm2', 'nm3') if k in index)
+        self.refs = [reference._fromRow(index, compCols, row) for row in self.resDict['res']]
 
     def __len__(self):
         return len(self.refs)
 
     def __iter__(self):
-        return self
+        return iter(self.refs)
+
+    def __getitem__(self, item):
+        return self.refs[item]
+
 
-    def next(self):
-        if self._currentRefIndex < len(self):
-            out = self.refs[self._currentRefIndex]
-            self._currentRefIndex += 1
-            return out
-        self._currentRefIndex = 0
-        raise StopIteration()
+class multiResult(result):
+    """ Class to store the merged results of several queries.
+
+    The :class:`.multiResult` object is created by the :func:`pyilt2.multiQuery` function.
+    It behaves like a :class:`pyilt2.result` object, but each data set (setid) is stored only once,
+    and the references can also be accessed by setid, like ``res['ZqnCF']``.
+    Each reference records the sub-queries ``(comp, prop)`` which matched it in :attr:`pyilt2.reference.queries`.
+    """
+
+    def __init__(self):
+        #: merged JSON objects of the sub-queries (:doc:`example <resdict>`)
+        self.resDict = {'header': [], 'res': [], 'errors': []}
+        self.refs = []
+        #: dict with the sub-query ``(comp, prop)`` as *key* and the exception as *value* for failed queries
+        self.errors = {}
+        self._bySetid = {}
 
     def __getitem__(self, item):
+        if isinstance(item, str):
+            return self._bySetid[item]
         return self.refs[item]
 
-    def _makeRefDict(self, refList):
-        out = {}
-        for i in range(0, len(refList)):
-            out[self.resDict['header'][i]] = refList[i]
-        return out
+    def __contains__(self, setid):
+        return setid in self._bySetid
+
+    def merge(self, res, subQuery):
+        """
+        Adds the references of a result object, which are not already included.
+
+        :param res: result of the sub-query
+        :type res: :class:`pyilt2.result`
+        :param subQuery: ``(comp, prop)`` of the sub-query
+        :type subQuery: tuple
+        """
+        if not self.resDict['header']:
+            self.resDict['header'] = res.resDict['header']
+        for row, ref in zip(res.resDict['res'], res.refs):
+            known = self._bySetid.get(ref.setid)
+            if known is None:
+                self.resDict['res'].append(row)
+                self.refs.append(ref)
+                self._bySetid[ref.setid] = known = ref
+            if subQuery not in known.queries:
+                known.queries.append(subQuery)
 
 
 class reference(object):
@@ -204,20 +291,44 @@ class reference(object):
     """
 
     def __init__(self, refDict):
-        self.refDict = refDict
-        #: number of components as integer
-        self.numOfComp = 0
-        #: names of component names as list of strings
-        self.listOfComp = []
-        self._parseComp()
+        self._init(refDict, None, None, None)
+
+    def _init(self, refDict, index, compCols, row):
+        # either the refDict or the row (with the map of column name to index) is given
+        self._refDict = refDict
+        self._index = index
+        self._compCols = compCols
+        self._row = row
+        #: sub-queries ``(comp, prop)`` of :func:`pyilt2.multiQuery` which matched this reference
+        self.queries = []
+        self._listOfComp = None
+
+    @classmethod
+    def _fromRow(cls, index, compCols, row):
+        # cheap constructor for :class:`pyilt2.result`: the refDict is built on first access only
+        ref = cls.__new__(cls)
+        ref._init(None, index, compCols, row)
+        return ref
 
     def __str__(self):
         return self.ref
 
+    @property
+    def refDict(self):
+        """part of ``resDict`` as dict (column name as *key*)"""
+        if self._refDict is None:
+            self._refDict = dict(zip(self._index, self._row))
+        return self._refDict
+
+    def _field(self, name):
+        if self._refDict is None:
+            return self._row[self._index[name]]
+        return self._refDict[name]
+
     @property
     def setid(self):
         """NIST setid (hash) as used as input for :class:`pyilt2.dataset`"""
-        return self.refDict['setid']
+        return self._field('setid')
 
     @property
     def ref(self):
@@ -225,7 +336,7 @@ class reference(object):
         Reference as in the result table on the website,
         like ``Muster et al. (2018)``, ``Muster and Mann (2018)`` or ``Muster (2018a)``.
         """
-        return self.refDict['ref']
+        return self._field('ref')
 
     @property
     def sref(self):
@@ -260,26 +371,39 @@ class reference(object):
     @property
     def prop(self):
         """physical property"""
-        return self.refDict['prp'].strip()
+        return self._field('prp').strip()
 
     @property
     def np(self):
         """Number of data points"""
-        return int(self.refDict['np'])
+        return int(self._field('np'))
 
-    def _parseComp(self):
-        for k in ['nm1', 'nm2', 'nm3']:
-            if self.refDict.get(k):
-                self.numOfComp += 1
-                self.listOfComp.append(self.refDict[k])
+    @property
+    def numOfComp(self):
+        """number of components as integer"""
+        return len(self.listOfComp)
+
+    @property
+    def listOfComp(self):
+        """names of component names as list of strings (parsed on first access)"""
+        if self._listOfComp is None:
+            if self._refDict is None:
+                row = self._row
+                self._listOfComp = [row[i] for i in self._compCols if row[i]]
+            else:
+                self._listOfComp = [self._refDict[k] for k in ('nm1', 'nm2', 'nm3') if self._refDict.get(k)]
+        return self._listOfComp
 
     def get(self):
         """ Returns the full data according to this reference.
+        If :data:`pyilt2.dataCache` is set, the data set is taken from (or added to) this cache.
 
         :return: Dataset object
         :rtype: :class:`pyilt2.dataset`
         """
-        return dataset(self.refDict['setid'])
+        if dataCache is not None:
+            return dataCache.get(self.setid, dataset)
+        return dataset(self.setid)
 
 
 class dataset(object):
@@ -289,10 +413,13 @@ class dataset(object):
 
     :param setid: NIST setid (hash)
     :type setid: str
+    :param setDict: decoded JSON object of the data set, e.g. as stored before.
+                    If given, the data set is created from it instead of requesting it from NIST.
+    :type setDict: dict
     :raises pyilt2.setIdError: if setid is invalid
     """
 
-    def __init__(self, setid):
+    def __init__(self, setid, setDict=None):
 
         #: NIST setid (hash) of this data set
         self.setid = setid
@@ -303,24 +430,30 @@ class dataset(object):
         #: :class:`numpy.ndarray` containing the data points
         self.data = np.array([])
 
-        #: List containing the **description** for each column of the data set
-        self.headerList = []
+        #: Tuple containing the **description** for each column of the data set
+        self.headerList = ()
 
-        #: List containing the **physical property** for each column of the data set
-        self.physProps = []
+        #: Tuple containing the **physical property** for each column of the data set
+        self.physProps = ()
 
-        #: List containing the **physical units** for each column of the data set
-        self.physUnits = []
+        #: Tuple containing the **physical units** for each column of the data set
+        self.physUnits = ()
 
-        #: List containing the phase information (if it make sense) for each column of the data set
-        self.phases = []
+        #: Tuple containing the phase information (if it make sense) for each column of the data set
+        self.phases = ()
 
-        self._initBySetid()
+        #: String of the column descriptions, as used as header by :meth:`.write`
+        self.headerLine = ''
+
+        if setDict is None:
+            self._initBySetid()
+        else:
+            self.setDict = setDict
         self._dataNpArray()
         self._dataHeader()
 
     def _initBySetid(self):
-        r = requests.get(dataUrl, params=dict(set=self.setid))
+        r = web.get(dataUrl, params=dict(set=self.setid))
         # raise HTTPError
         r.raise_for_status()
         # check if response is empty
@@ -329,37 +462,8 @@ class dataset(object):
         self.setDict = r.json()
 
     def _dataHeader(self):
-        headerList = self.setDict['dhead']
-        cnt = 0
-        for col in headerList:
-            prop = col[0].replace('<SUP>', '').replace('</SUP>', '')
-            if len(col) == 2:
-                phase = col[1]
-            else:
-                phase = None
-            if ',' in prop:
-                tmp = prop.split(',')
-                prop = ''.join(tmp[0:-1])
-                units = tmp[-1].strip()
-            else:
-                units = None
-            prop = prop.replace(' ', '_')
-            desc = prop
-            if phase:
-                desc = '{0:s}[{1:s}]'.format(prop, phase)
-            if units:
-                desc = '{0:s}/{1:s}'.format(desc, units)
-            self.headerList.append(desc)
-            self.physProps.append(prop)
-            self.physUnits.append(units)
-            self.phases.append(phase)
-            if self._incol[cnt] is 2:
-                self.headerList.append('Delta(prev)')
-                self.physProps.append('Delta[{0:s}]'.format(prop))
-                self.physUnits.append(units)
-                self.phases.append(phase)
-            cnt += 1
-        self.headerLine = '  '.join(self.headerList)
+        (self.headerList, self.physProps, self.physUnits,
+         self.phases, self.headerLine) = _parseHeader(tuple(map(tuple, self.setDict['dhead'])), tuple(self._incol))
 
     def _dataNpArray(self):
         raw = self.setDict['data']
@@ -376,6 +480,41 @@ class dataset(object):
             for j in range(0, len(newrow)):
                 self.data[i][j] = newrow[j]
 
+    @property
+    def canonProps(self):
+        """List of canonical short names (see :func:`pyilt2.units.canonicalProp`) for each column of the data set,
+        like ``['T', 'P', 'dens', 'Delta[dens]']``."""
+        return [units.canonicalProp(prop) for prop in self.physProps]
+
+    @property
+    def columns(self):
+        """Structured view of :attr:`.data` with named fields, like ``T``, ``x1`` or ``Delta[dens]``
+        (see :func:`pyilt2.mixture.columns`)."""
+        return mixture.columns(self)
+
+    def toSI(self):
+        """
+        Converts the data columns in place to SI units, as defined in :data:`pyilt2.units.unit2si`.
+        Each column is scaled (and shifted) in a single vectorized operation on :attr:`.data`;
+        :attr:`.physUnits` and :attr:`.headerList` are updated accordingly.
+        Columns with unknown units stay as they are.
+
+        :return: the data set itself
+        :rtype: :class:`pyilt2.dataset`
+        """
+        factors, offsets, siUnits = units.siPlan(self.physProps, self.physUnits)
+        if not ((factors == 1.0).all() and (offsets == 0.0).all()):
+            self.data *= factors
+            self.data += offsets
+        headerList = list(self.headerList)
+        for i in range(0, len(siUnits)):
+            if siUnits[i] != self.physUnits[i] and headerList[i] != 'Delta(prev)':
+                headerList[i] = headerList[i][:-len(self.physUnits[i])] + siUnits[i]
+        self.headerList = tuple(headerList)
+        self.physUnits = siUnits
+        self.headerLine = '  '.join(self.headerList)
+        return self
+
     @property
     def fullcite(self):
         return '"{0:s}", {1:s}'.format(self.setDict['ref']['title'], self.setDict['ref']['full'])
@@ -422,6 +561,56 @@ class dataset(object):
                    newline='\n', header=header, comments='# ')
 
 
+@functools.lru_cache(maxsize=1024)
+def _parseHeader(dhead, incol):
+    """
+    Parses the data header ``setDict['dhead']`` of a data set.
+    Because only a few distinct headers exist in the database, the results are cached
+    per ``(dhead, incol)`` signature and shared (as tuples) by all data sets with the same header.
+
+    :param dhead: data header as tuple of tuples
+    :type dhead: tuple
+    :param incol: number of values (with uncertainty: 2) per column
+    :type incol: tuple
+    :return: ``(headerList, physProps, physUnits, phases, headerLine)``
+    :rtype: tuple
+    """
+    headerList = []
+    physProps = []
+    physUnits = []
+    phases = []
+    cnt = 0
+    for col in dhead:
+        prop = col[0].replace('<SUP>', '').replace('</SUP>', '')
+        if len(col) == 2:
+            phase = col[1]
+        else:
+            phase = None
+        if ',' in prop:
+            tmp = prop.split(',')
+            prop = ''.join(tmp[0:-1])
+            unit = tmp[-1].strip()
+        else:
+            unit = None
+        prop = prop.replace(' ', '_')
+        desc = prop
+        if phase:
+            desc = '{0:s}[{1:s}]'.format(prop, phase)
+        if unit:
+            desc = '{0:s}/{1:s}'.format(desc, unit)
+        headerList.append(desc)
+        physProps.append(prop)
+        physUnits.append(unit)
+        phases.append(phase)
+        if incol[cnt] == 2:
+            headerList.append('Delta(prev)')
+            physProps.append('Delta[{0:s}]'.format(prop))
+            physUnits.append(unit)
+            phases.append(phase)
+        cnt += 1
+    return tuple(headerList), tuple(physProps), tuple(physUnits), tuple(phases), '  '.join(headerList)
+
+
 class queryError(Exception):
     """Exception if the database returns an Error on a query."""
 
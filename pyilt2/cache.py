@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+In-process cache for data sets
+
+A :class:`datasetCache` keeps recently used :class:`pyilt2.dataset` objects in memory,
+so that repeated calls of :meth:`pyilt2.reference.get` for popular setids don't hit the NIST server again.
+It is activated by assigning it to :data:`pyilt2.dataCache`:
+
+.. code-block:: py
+
+    import pyilt2
+    from pyilt2.cache import datasetCache
+
+    pyilt2.dataCache = datasetCache(maxBytes=512 * 2**20)
+
+.. note::
+
+    Cached data sets are shared by all callers, so treat them as read-only
+    (e.g. don't use :meth:`pyilt2.dataset.toSI` on them).
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import collections
+import threading
+import weakref
+
+# approximate bytes per data point held by the Python lists of setDict['data'] (float object + list slot)
+_bytesPerValue = 32
+# approximate bytes for the remaining meta data of a data set
+_bytesMetaData = 4096
+
+
+def datasetSize(dataSet):
+    """
+    Estimates the memory used by a data set, computed from :attr:`pyilt2.dataset.data` ``.nbytes``
+    plus the raw data and meta data of :attr:`pyilt2.dataset.setDict`.
+
+    :param dataSet: data set
+    :type dataSet: :class:`pyilt2.dataset`
+    :return: size in bytes
+    :rtype: int
+    """
+    return int(dataSet.data.nbytes + dataSet.data.size * _bytesPerValue + _bytesMetaData)
+
+
+class datasetCache(object):
+    """
+    Thread-safe LRU cache of :class:`pyilt2.dataset` objects with a memory budget.
+
+    Least recently used data sets are evicted as soon as the sum of their sizes (see :func:`datasetSize`)
+    exceeds ``maxBytes``. Evicted data sets which are still in use somewhere are tracked by weak references,
+    so they are handed out again instead of being requested twice.
+    Concurrent requests for the same missing setid are coalesced into a single request.
+
+    :param maxBytes: memory budget in bytes
+    :type maxBytes: int
+    """
+
+    def __init__(self, maxBytes=256 * 2**20):
+        self.maxBytes = maxBytes
+        self._lru = collections.OrderedDict()
+        self._weak = weakref.WeakValueDictionary()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = collections.Counter()
+
+    def __len__(self):
+        return len(self._lru)
+
+    def __contains__(self, setid):
+        return setid in self._lru
+
+    def _lookup(self, setid, count=True):
+        # has to be called with the lock held
+        if setid in self._lru:
+            self._lru.move_to_end(setid)
+            if count:
+                self._stats['hits'] += 1
+            return self._lru[setid][0]
+        dataSet = self._weak.get(setid)
+        if dataSet is not None:
+            if count:
+                self._stats['weakHits'] += 1
+            self._admit(dataSet)
+        return dataSet
+
+    def _admit(self, dataSet):
+        # has to be called with the lock held
+        size = datasetSize(dataSet)
+        if dataSet.setid in self._lru:
+            self._bytes -= self._lru.pop(dataSet.setid)[1]
+        self._lru[dataSet.setid] = (dataSet, size)
+        self._weak[dataSet.setid] = dataSet
+        self._bytes += size
+        while self._bytes > self.maxBytes and len(self._lru) > 1:
+            setid, (old, oldSize) = self._lru.popitem(last=False)
+            self._bytes -= oldSize
+            self._stats['evictions'] += 1
+
+    def get(self, setid, loader):
+        """
+        Returns the data set from the cache or creates it by ``loader(setid)`` and caches it.
+
+        :param setid: NIST setid (hash)
+        :type setid: str
+        :param loader: callable which creates the data set on a miss, like :class:`pyilt2.dataset`
+        :return: data set
+        :rtype: :class:`pyilt2.dataset`
+        """
+        with self._lock:
+            dataSet = self._lookup(setid)
+            if dataSet is not None:
+                return dataSet
+            event = self._pending.get(setid)
+            owner = event is None
+            if owner:
+                event = self._pending[setid] = threading.Event()
+                self._stats['misses'] += 1
+            else:
+                self._stats['coalesced'] += 1
+        if not owner:
+            event.wait()
+            with self._lock:
+                dataSet = self._lookup(setid, count=False)
+            if dataSet is not None:
+                return dataSet
+            # the owner failed, so try it on our own
+            return self.get(setid, loader)
+        try:
+            dataSet = loader(setid)
+            with self._lock:
+                self._admit(dataSet)
+        finally:
+            with self._lock:
+                del self._pending[setid]
+            event.set()
+        return dataSet
+
+    def put(self, dataSet):
+        """
+        Adds a data set to the cache.
+
+        :param dataSet: data set
+        :type dataSet: :class:`pyilt2.dataset`
+        """
+        with self._lock:
+            self._admit(dataSet)
+
+    def clear(self):
+        """Removes all data sets from the cache and resets the statistics."""
+        with self._lock:
+            self._lru.clear()
+            self._weak.clear()
+            self._bytes = 0
+            self._stats.clear()
+
+    def stats(self):
+        """
+        Returns the cache statistics as dict, like::
+
+            {'entries': 120, 'bytes': 5242880, 'maxBytes': 268435456,
+             'hits': 1024, 'weakHits': 3, 'misses': 120, 'coalesced': 7, 'evictions': 0,
+             'hitRate': 0.895}
+
+        :rtype: dict
+        """
+        with self._lock:
+            out = dict(entries=len(self._lru), bytes=self._bytes, maxBytes=self.maxBytes)
+            for k in ('hits', 'weakHits', 'misses', 'coalesced', 'evictions'):
+                out[k] = self._stats[k]
+        total = out['hits'] + out['weakHits'] + out['misses'] + out['coalesced']
+        out['hitRate'] = float(total - out['misses']) / total if total else 0.0
+        return out
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+Catalog of data set summaries
+
+Listing many references with their temperature range or value range would require
+to request and parse every full :class:`pyilt2.dataset`.
+A :class:`catalog` keeps a summary of each data set instead, computed once when the data set is added:
+per column the minimum, maximum, mean and number of values (in SI units, see :mod:`pyilt2.units`),
+and for columns with uncertainties (``Delta(prev)``) the mean and maximum uncertainty.
+The summaries are stored column-wise in a few :mod:`numpy` arrays, so they can be searched
+and saved without the data arrays:
+
+.. code-block:: py
+
+    from pyilt2.catalog import catalog
+
+    cat = catalog()
+    for ref in res:
+        cat.add(ref.get())
+    cat.save('catalog.npz')
+
+    cat = catalog.load('catalog.npz')
+    setids = cat.find(prop='dens', T=(290, 310))
+    print(cat.column('T'))    # setid, min, max, mean, count, uncMean, uncMax per data set
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import json
+import threading
+
+import numpy as np
+
+from . import units
+
+#: fields of the statistics per column
+statFields = ('min', 'max', 'mean', 'count', 'uncMean', 'uncMax')
+
+_tableDtype = np.dtype([('set', np.int32), ('name', np.int32), ('unit', np.int32),
+                        ('min', np.float64), ('max', np.float64), ('mean', np.float64),
+                        ('count', np.int32), ('uncMean', np.float64), ('uncMax', np.float64)])
+
+
+def _columnStats(data):
+    """Returns min, max, mean and count of the finite values of each column (NaN for empty columns)."""
+    finite = np.isfinite(data)
+    count = finite.sum(axis=0)
+    empty = count == 0
+    lo = np.where(finite, data, np.inf).min(axis=0)
+    hi = np.where(finite, data, -np.inf).max(axis=0)
+    mean = np.where(finite, data, 0.0).sum(axis=0) / np.maximum(count, 1)
+    lo[empty] = hi[empty] = mean[empty] = np.nan
+    return lo, hi, mean, count
+
+
+def summarize(dataSet):
+    """
+    Computes the summary of a data set, like::
+
+        {'setid': 'ZqnCF', 'title': 'Density: Density', 'components': ['...'], 'rows': 12,
+         'columns': [{'name': 'T', 'unit': 'K', 'min': 293.15, 'max': 353.15, 'mean': 323.15, 'count': 12,
+                      'uncMean': 0.01, 'uncMax': 0.01}, ...]}
+
+    The columns are named by :func:`pyilt2.units.canonicalProp` and the statistics are in SI units;
+    uncertainty columns are folded into the column before (*uncMean* and *uncMax* are NaN if there are none).
+
+    :param dataSet: data set
+    :type dataSet: :class:`pyilt2.dataset`
+    :rtype: dict
+    """
+    factors, offsets, siUnits = units.siPlan(dataSet.physProps, dataSet.physUnits)
+    data = dataSet.data * factors + offsets
+    lo, hi, mean, count = _columnStats(data)
+    columns = []
+    for i, prop in enumerate(dataSet.physProps):
+        if prop.startswith('Delta['):
+            if columns:
+                columns[-1]['uncMean'] = float(mean[i])
+                columns[-1]['uncMax'] = float(hi[i])
+            continue
+        columns.append(dict(name=units.canonicalProp(prop), unit=siUnits[i],
+                            min=float(lo[i]), max=float(hi[i]), mean=float(mean[i]), count=int(count[i]),
+                            uncMean=np.nan, uncMax=np.nan))
+    return dict(setid=dataSet.setid, title=dataSet.setDict.get('title', ''),
+                components=list(dataSet.listOfComp), rows=len(dataSet.data), columns=columns)
+
+
+class catalog(object):
+    """
+    Thread-safe index of data set summaries (see :func:`summarize`).
+    """
+
+    def __init__(self):
+        self._setids = []
+        self._bySetid = {}
+        self._meta = []
+        self._names = []
+        self._nameCodes = {}
+        self._units = []
+        self._unitCodes = {}
+        self._rows = []
+        self._table = np.zeros(0, dtype=_tableDtype)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._setids)
+
+    def __contains__(self, setid):
+        return setid in self._bySetid
+
+    @property
+    def setids(self):
+        """setids of all data sets in the catalog"""
+        return list(self._setids)
+
+    @staticmethod
+    def _code(values, codes, value):
+        if value not in codes:
+            codes[value] = len(values)
+            values.append(value)
+        return codes[value]
+
+    def add(self, dataSet):
+        """
+        Adds (or replaces) the summary of a data set.
+
+        :param dataSet: data set
+        :type dataSet: :class:`pyilt2.dataset`
+        """
+        self.addSummary(summarize(dataSet))
+
+    def addSummary(self, summary):
+        """
+        Adds (or replaces) a summary as returned by :func:`summarize`.
+
+        :param summary: summary
+        :type summary: dict
+        """
+        with self._lock:
+            if summary['setid'] in self._bySetid:
+                self._remove(summary['setid'])
+            n = len(self._setids)
+            self._setids.append(summary['setid'])
+            self._bySetid[summary['setid']] = n
+            self._meta.append(dict(title=summary['title'], components=summary['components'], rows=summary['rows']))
+            for col in summary['columns']:
+                self._rows.append((n, self._code(self._names, self._nameCodes, col['name']),
+                                   self._code(self._units, self._unitCodes, col['unit'] or ''))
+                                  + tuple(col[k] for k in statFields))
+
+    def _remove(self, setid):
+        # has to be called with the lock held
+        table = self._tableLocked()
+        n = self._bySetid.pop(setid)
+        del self._setids[n]
+        del self._meta[n]
+        table = table[table['set'] != n]
+        table['set'][table['set'] > n] -= 1
+        self._table = table
+        self._bySetid = {s: i for i, s in enumerate(self._setids)}
+
+    def _tableLocked(self):
+        if self._rows:
+            self._table = np.concatenate([self._table, np.array(self._rows, dtype=_tableDtype)])
+            self._rows = []
+        return self._table
+
+    def _tableArray(self):
+        with self._lock:
+            return self._tableLocked(), list(self._setids), list(self._meta), dict(self._nameCodes)
+
+    def summary(self, setid):
+        """
+        Returns the summary of a data set as by :func:`summarize`.
+
+        :param setid: NIST setid (hash)
+        :type setid: str
+        :rtype: dict
+        :raises KeyError: if the data set is not in the catalog
+        """
+        table, setids, meta, _ = self._tableArray()
+        n = self._bySetid[setid]
+        columns = [dict(name=self._names[row['name']], unit=self._units[row['unit']] or None,
+                        **{k: row[k].item() for k in statFields})
+                   for row in table[table['set'] == n]]
+        return dict(setid=setid, columns=columns, **meta[n])
+
+    def column(self, name):
+        """
+        Returns the statistics of a column (canonical name, like ``'T'``) for all data sets which have it.
+        If a data set has several columns of this name (like ``'x'`` of a ternary mixture), all are listed.
+
+        :param name: canonical column name
+        :type name: str
+        :return: structured array with the fields *setid*, *unit* and :data:`statFields`
+        :rtype: :class:`numpy.ndarray`
+        """
+        table, setids, _, nameCodes = self._tableArray()
+        rows = table[table['name'] == nameCodes[name]] if name in nameCodes else table[:0]
+        out = np.zeros(len(rows), dtype=[('setid', 'U{0:d}'.format(max([len(s) for s in setids] + [1]))),
+                                         ('unit', 'U{0:d}'.format(max([len(u) for u in self._units] + [1])))]
+                       + [(k, _tableDtype[k]) for k in statFields])
+        out['setid'] = np.array(setids + [''])[rows['set']]
+        out['unit'] = np.array(self._units + [''])[rows['unit']]
+        for k in statFields:
+            out[k] = rows[k]
+        return out
+
+    def find(self, prop=None, comp=None, numOfComp=None, **ranges):
+        """
+        Finds data sets by their summaries, like ``cat.find(prop='dens', T=(290, 310), P=(None, 2e5))``.
+
+        :param prop: canonical name of a column the data set must have
+        :type prop: str
+        :param comp: part of a component name (case-insensitive)
+        :type comp: str
+        :param numOfComp: number of components
+        :type numOfComp: int
+        :param ranges: canonical column name as *key* and ``(low, high)`` in SI units as *value*;
+                       the range of the column has to overlap it (*None* for an open bound)
+        :return: setids
+        :rtype: list
+        """
+        table, setids, meta, nameCodes = self._tableArray()
+        match = np.ones(len(setids), dtype=bool)
+        if prop is not None:
+            ranges[prop] = ranges.get(prop, (None, None))
+        for name, (low, high) in ranges.items():
+            if name not in nameCodes:
+                return []
+            rows = table[table['name'] == nameCodes[name]]
+            ok = np.ones(len(rows), dtype=bool)
+            if low is not None:
+                ok &= rows['max'] >= low
+            if high is not None:
+                ok &= rows['min'] <= high
+            hit = np.zeros(len(setids), dtype=bool)
+            hit[rows['set'][ok]] = True
+            match &= hit
+        if comp or numOfComp:
+            comp = comp.lower() if comp else None
+            for n in np.flatnonzero(match):
+                comps = meta[n]['components']
+                if (numOfComp and len(comps) != numOfComp) or \
+                        (comp and not any(comp in c.lower() for c in comps)):
+                    match[n] = False
+        return [setids[n] for n in np.flatnonzero(match)]
+
+    def save(self, filename):
+        """
+        Writes the catalog to a compressed :mod:`numpy` file (``.npz``).
+
+        :param filename: file name
+        :type filename: str
+        """
+        table, setids, meta, _ = self._tableArray()
+        np.savez_compressed(filename, table=table,
+                            index=np.array(json.dumps(dict(setids=setids, meta=meta,
+                                                           names=self._names, units=self._units))))
+
+    @classmethod
+    def load(cls, filename):
+        """
+        Reads a catalog written by :meth:`save`.
+
+        :param filename: file name
+        :type filename: str
+        :rtype: :class:`catalog`
+        """
+        with np.load(filename) as npz:
+            table = npz['table']
+            index = json.loads(str(npz['index']))
+        cat = cls()
+        cat._table = table.astype(_tableDtype)
+        cat._setids = index['setids']
+        cat._bySetid = {s: i for i, s in enumerate(cat._setids)}
+        cat._meta = index['meta']
+        cat._names = index['names']
+        cat._nameCodes = {s: i for i, s in enumerate(cat._names)}
+        cat._units = index['units']
+        cat._unitCodes = {s: i for i, s in enumerate(cat._units)}
+        return cat
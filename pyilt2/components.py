@@ -0,0 +1,416 @@
+# -*- coding: utf-8 -*-
+"""
+Local search index for components
+
+:func:`pyilt2.query` matches components only by name, formula or CAS number on the NIST server.
+A :class:`componentIndex` searches the component names locally, by substring or by tokens,
+and finds structurally similar ionic liquids by comparing the SMILES of their cations and anions.
+It is built from ``name_to_smiles.json`` (shipped with pyilt2) and may be extended by the components of
+:class:`pyilt2.result` and :class:`pyilt2.dataset` objects, which also maps the hits back to setids:
+
+.. code-block:: py
+
+    from pyilt2.components import componentIndex
+
+    idx = componentIndex()
+    idx.addResult(pyilt2.query(comp='imidazolium', prop='xXKp'))
+    for name, score in idx.similar(name='1-butyl-3-methylimidazolium hexafluorophosphate', by='cation'):
+        print(name, score, idx.setids([name]))
+
+The similarity is the Tanimoto coefficient of hashed circular fingerprints (atom environments, like ECFP4)
+of the molecular graph parsed from the SMILES (no cheminformatics toolkit needed).
+Bond orders and charges are left out, so different spellings of an ion (Kekulé or aromatic form,
+resonance structures, atom order) give the same fingerprint. It is a rough but fast measure:
+all entries are scored by a few vectorized operations.
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import bisect
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+#: JSON file with component names as *key* and SMILES as *value*
+smilesFile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'name_to_smiles.json')
+
+#: number of bits of the fingerprints
+fpBits = 1024
+#: radius of the atom environments hashed into the fingerprints (in bonds)
+fpRadius = 2
+
+_charge = re.compile(r'\[[^\]]*?([+-]+)(\d*)\]')
+_smilesToken = re.compile(r'(\[[^\]]*\])|(Br|Cl|[BCNOPSFI]|[bcnops]|\*)|(\()|(\))|(%\d\d|\d)|(\.)|[-=#$:/\\~]')
+_bracketElement = re.compile(r'\[\d*([A-Z][a-z]?|se|as|[bcnops]|\*)')
+_token = re.compile(r'[a-z0-9]+')
+if hasattr(np, 'bitwise_count'):
+    _popcount = np.bitwise_count
+else:
+    _popcountTable = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+    def _popcount(a):
+        return _popcountTable[a.view(np.uint8)]
+
+
+def loadSmiles(filename=None):
+    """
+    Reads a JSON file with component names and SMILES.
+
+    :param filename: file name (default: :data:`smilesFile`)
+    :type filename: str
+    :return: dict with the component name as *key* and the SMILES as *value*
+    :rtype: dict
+    """
+    with open(filename or smilesFile) as fp:
+        return json.load(fp)
+
+
+def splitIons(smiles):
+    """
+    Splits the SMILES of a salt into cation(s) and anion(s) by the net charge of each fragment.
+
+    .. code-block:: py
+
+        >>> splitIons('CCCCN1C=C[N+](=C1)C.F[P-](F)(F)(F)(F)F')
+        ('CCCCN1C=C[N+](=C1)C', 'F[P-](F)(F)(F)(F)F')
+
+    :param smiles: SMILES
+    :type smiles: str
+    :return: ``(cation, anion)``, several fragments of the same kind are joined by ``.``,
+             missing ones are empty strings
+    :rtype: tuple
+    """
+    cations, anions = [], []
+    for frag in smiles.split('.'):
+        net = 0
+        for signs, num in _charge.findall(frag):
+            n = int(num) if num else len(signs)
+            net += n if signs[0] == '+' else -n
+        if net > 0:
+            cations.append(frag)
+        elif net < 0:
+            anions.append(frag)
+    return '.'.join(cations), '.'.join(anions)
+
+
+def parseSmiles(smiles):
+    """
+    Parses the molecular graph of a SMILES, without hydrogens, bond orders, charges and stereo information.
+
+    .. code-block:: py
+
+        >>> parseSmiles('C[N+]1=CN(C)C=C1')
+        (['C', 'N', 'C', 'N', 'C', 'C', 'C'], [(0, 1), (1, 2), (2, 3), (3, 4), (3, 5), (5, 6), (1, 6)])
+
+    :param smiles: SMILES
+    :type smiles: str
+    :return: ``(elements, bonds)``, the element symbol of each atom (aromatic atoms capitalized)
+             and the bonds as pairs of atom indices
+    :rtype: tuple
+    :raises ValueError: if the SMILES can't be parsed
+    """
+    elements = []
+    bonds = []
+    rings = {}
+    stack = []
+    prev = None
+    pos = 0
+    while pos < len(smiles):
+        m = _smilesToken.match(smiles, pos)
+        if m is None:
+            raise ValueError('Invalid SMILES "{0:s}" at position {1:d}!'.format(smiles, pos))
+        pos = m.end()
+        bracket, organic, opening, closing, ring, dot = m.groups()
+        if bracket or organic:
+            if bracket:
+                el = _bracketElement.match(bracket)
+                if el is None:
+                    raise ValueError('Invalid atom "{0:s}" in SMILES "{1:s}"!'.format(bracket, smiles))
+                organic = el.group(1)
+            elements.append(organic.capitalize())
+            if prev is not None:
+                bonds.append((prev, len(elements) - 1))
+            prev = len(elements) - 1
+        elif opening:
+            stack.append(prev)
+        elif closing:
+            if not stack:
+                raise ValueError('Unbalanced parentheses in SMILES "{0:s}"!'.format(smiles))
+            prev = stack.pop()
+        elif ring:
+            if prev is None:
+                raise ValueError('Ring closure without atom in SMILES "{0:s}"!'.format(smiles))
+            if ring in rings:
+                bonds.append((rings.pop(ring), prev))
+            else:
+                rings[ring] = prev
+        elif dot:
+            prev = None
+    if stack or rings:
+        raise ValueError('Unclosed branch or ring in SMILES "{0:s}"!'.format(smiles))
+    return elements, bonds
+
+
+def _ringBonds(n, neighbors):
+    """Returns the set of bonds (as sorted pairs) which are part of a ring, i.e. which are not bridges."""
+    order = [-1] * n
+    low = [0] * n
+    ring = set()
+    count = 0
+    for root in range(n):
+        if order[root] >= 0:
+            continue
+        order[root] = low[root] = count
+        count += 1
+        # iterative depth-first search: (atom, parent, iterator over the neighbors)
+        stack = [(root, -1, iter(neighbors[root]))]
+        while stack:
+            atom, parent, it = stack[-1]
+            for nb in it:
+                if order[nb] < 0:
+                    order[nb] = low[nb] = count
+                    count += 1
+                    stack.append((nb, atom, iter(neighbors[nb])))
+                    break
+                if nb != parent:
+                    # a bond to an atom visited before closes a ring
+                    low[atom] = min(low[atom], order[nb])
+                    ring.add((min(atom, nb), max(atom, nb)))
+            else:
+                stack.pop()
+                if parent >= 0:
+                    low[parent] = min(low[parent], low[atom])
+                    if low[atom] <= order[parent]:
+                        ring.add((min(atom, parent), max(atom, parent)))
+    return ring
+
+
+def fingerprint(smiles):
+    """
+    Returns a fingerprint of a SMILES: the atom environments up to :data:`fpRadius` bonds
+    (element, number of neighbors and ring membership of the atoms) hashed into :data:`fpBits` bits.
+
+    :param smiles: SMILES
+    :type smiles: str
+    :return: packed bits
+    :rtype: :class:`numpy.ndarray` of uint64
+    :raises ValueError: if the SMILES can't be parsed
+    """
+    elements, bonds = parseSmiles(smiles)
+    n = len(elements)
+    neighbors = [[] for i in range(n)]
+    for a, b in bonds:
+        neighbors[a].append(b)
+        neighbors[b].append(a)
+    ring = _ringBonds(n, neighbors)
+    kind = {}
+    for a, b in bonds:
+        kind[a, b] = kind[b, a] = 'r' if (min(a, b), max(a, b)) in ring else 'c'
+    ids = [zlib.crc32('{0:s}{1:d}{2:s}'.format(
+        elements[i], len(neighbors[i]), 'r' if 'r' in [kind[i, j] for j in neighbors[i]] else 'c').encode('utf-8'))
+        for i in range(n)]
+    found = set(ids)
+    for radius in range(fpRadius):
+        ids = [zlib.crc32('{0:d}|{1:s}'.format(ids[i], ','.join(sorted(
+            '{0:s}{1:d}'.format(kind[i, j], ids[j]) for j in neighbors[i]))).encode('utf-8'))
+            for i in range(n)]
+        found.update(ids)
+    bits = np.zeros(fpBits, dtype=bool)
+    bits[[i % fpBits for i in found]] = True
+    return np.packbits(bits).view(np.uint64)
+
+
+def tanimoto(fps, fp):
+    """
+    Tanimoto coefficients between each row of *fps* and *fp* (both packed bits).
+
+    :rtype: :class:`numpy.ndarray`
+    """
+    both = _popcount(fps & fp).sum(axis=1)
+    either = _popcount(fps | fp).sum(axis=1)
+    return np.where(either > 0, both / np.maximum(either, 1), 0.0)
+
+
+class componentIndex(object):
+    """
+    Search index of component names and their SMILES.
+
+    :param smiles: dict with the component name as *key* and SMILES as *value*
+                   (default: read from :data:`smilesFile`)
+    :type smiles: dict
+    """
+
+    def __init__(self, smiles=None):
+        self._smiles = {}
+        self._setids = {}
+        self._tokens = {}
+        self._names = []
+        self._fps = None
+        self._haystack = None
+        self._starts = None
+        for name, smi in (loadSmiles() if smiles is None else smiles).items():
+            self.add(name, smi)
+
+    def __len__(self):
+        return len(self._smiles)
+
+    def __contains__(self, name):
+        return name in self._smiles
+
+    def add(self, name, smiles=None, setid=None):
+        """
+        Adds a component (and the setid of a data set it belongs to).
+
+        :param name: component name
+        :type name: str
+        :param smiles: SMILES (keeps the known one if *None*)
+        :type smiles: str
+        :param setid: NIST setid (hash)
+        :type setid: str
+        """
+        if name not in self._smiles:
+            self._smiles[name] = smiles
+            self._names.append(name)
+            self._haystack = None
+            for tok in set(_token.findall(name.lower())):
+                self._tokens.setdefault(tok, set()).add(name)
+            self._fps = None
+        elif smiles and self._smiles[name] != smiles:
+            self._smiles[name] = smiles
+            self._fps = None
+        if setid:
+            self._setids.setdefault(name, set()).add(setid)
+
+    def addResult(self, resObj):
+        """
+        Adds the components of all references of a result object.
+
+        :param resObj: result object
+        :type resObj: :class:`pyilt2.result`
+        """
+        for ref in resObj.refs:
+            for name in ref.listOfComp:
+                self.add(name, setid=ref.setid)
+
+    def addDataset(self, dataSet):
+        """
+        Adds the components of a data set.
+
+        :param dataSet: data set
+        :type dataSet: :class:`pyilt2.dataset`
+        """
+        for name in dataSet.listOfComp:
+            self.add(name, setid=dataSet.setid)
+
+    def smiles(self, name):
+        """Returns the SMILES of a component or *None*."""
+        return self._smiles.get(name)
+
+    def setids(self, names):
+        """
+        Returns the setids of all known data sets which include one of the components.
+
+        :param names: component names
+        :type names: list
+        :rtype: set
+        """
+        out = set()
+        for name in names:
+            out |= self._setids.get(name, set())
+        return out
+
+    def substring(self, text):
+        """
+        Finds all components whose name contains *text* (case-insensitive).
+
+        :param text: part of the name
+        :type text: str
+        :return: component names
+        :rtype: list
+        """
+        if self._haystack is None:
+            # one string to search in, the start of each name is known by its index
+            self._haystack = '\n'.join(name.lower() for name in self._names)
+            self._starts = [0]
+            for name in self._names:
+                self._starts.append(self._starts[-1] + len(name) + 1)
+        text = text.lower()
+        out = []
+        pos = self._haystack.find(text)
+        while pos >= 0:
+            i = bisect.bisect_right(self._starts, pos) - 1
+            out.append(self._names[i])
+            # continue with the next name
+            pos = self._haystack.find(text, self._starts[i + 1]) if i + 1 < len(self._names) else -1
+        return out
+
+    def tokens(self, text):
+        """
+        Finds all components whose name contains all words (alphanumeric tokens) of *text*,
+        like ``'butyl imidazolium'``.
+
+        :param text: words
+        :type text: str
+        :return: component names
+        :rtype: list
+        """
+        toks = _token.findall(text.lower())
+        if not toks:
+            return []
+        hits = set.intersection(*[self._tokens.get(tok, set()) for tok in toks])
+        return [name for name in self._names if name in hits]
+
+    def _fingerprints(self):
+        if self._fps is None:
+            fps = np.zeros((2, len(self._names), fpBits // 64), dtype=np.uint64)
+            for i, name in enumerate(self._names):
+                if self._smiles[name]:
+                    cation, anion = splitIons(self._smiles[name])
+                    try:
+                        fps[0, i] = fingerprint(cation) if cation else 0
+                        fps[1, i] = fingerprint(anion) if anion else 0
+                    except ValueError:
+                        # an invalid SMILES is never similar
+                        fps[:, i] = 0
+            self._fps = fps
+        return self._fps
+
+    def similar(self, name=None, smiles=None, by='both', limit=10, threshold=0.0):
+        """
+        Finds the components most similar to a given one by their cation and/or anion.
+
+        :param name: name of a component of the index
+        :type name: str
+        :param smiles: SMILES (instead of *name*)
+        :type smiles: str
+        :param by: compare ``'cation'``, ``'anion'`` or ``'both'`` (mean of both)
+        :type by: str
+        :param limit: maximum number of hits
+        :type limit: int
+        :param threshold: minimum similarity (0 ... 1)
+        :type threshold: float
+        :return: list of ``(name, similarity)``, most similar first
+        :rtype: list
+        :raises KeyError: if there is no SMILES for *name*
+        :raises ValueError: if the SMILES can't be parsed
+        """
+        if smiles is None:
+            smiles = self._smiles.get(name)
+            if not smiles:
+                raise KeyError('No SMILES known for "{0:s}"!'.format(str(name)))
+        cation, anion = splitIons(smiles)
+        fps = self._fingerprints()
+        if by == 'cation' or (by == 'both' and not anion):
+            score = tanimoto(fps[0], fingerprint(cation))
+        elif by == 'anion' or (by == 'both' and not cation):
+            score = tanimoto(fps[1], fingerprint(anion))
+        elif by == 'both':
+            score = (tanimoto(fps[0], fingerprint(cation)) + tanimoto(fps[1], fingerprint(anion))) / 2
+        else:
+            raise ValueError('Invalid value "{0:s}" for by!'.format(str(by)))
+        order = np.argsort(-score, kind='stable')[:limit]
+        return [(self._names[i], float(score[i])) for i in order if score[i] >= threshold and score[i] > 0]
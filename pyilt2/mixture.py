@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Named column views and batches of data sets
+
+The columns of :attr:`pyilt2.dataset.data` are only told apart by the strings of
+:attr:`pyilt2.dataset.headerList`, which is tedious for mixtures with several composition columns.
+:func:`columns` returns a structured view of the data with one named field per column
+(see :func:`fieldNames`), like ``T``, ``P``, ``x1`` (mole fraction of the 1st component) or ``Delta[dens]``,
+without copying the data:
+
+.. code-block:: py
+
+    from pyilt2 import mixture
+
+    cols = mixture.columns(dataSet)
+    cols['x1'], cols['T']
+
+A :class:`batch` stacks the rows of many data sets into one structured array (in SI units)
+and keeps the offsets of each data set, so that computations run vectorized over all data sets at once,
+with the composition fields mapped to a common order of components:
+
+.. code-block:: py
+
+    b = mixture.batch(dataSets, components=['water', '1-butyl-3-methylimidazolium chloride'])
+    b.values['x1']                    # mole fraction of water of all rows
+    b.reduce(np.maximum, 'T')         # maximum temperature per data set
+    b.padded('x1')                    # 2D array (data sets x rows), padded with NaN
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import numpy as np
+
+from . import units
+from .units import compositionColumns
+
+
+def _component(prop, comps):
+    """Returns the index of the component a composition column refers to, or *None*."""
+    name = prop.replace('_', ' ').lower()
+    hits = [i for i, comp in enumerate(comps) if name.endswith(comp.lower())]
+    if hits:
+        # the longest name wins (e.g. 'sodium chloride' vs. 'chloride')
+        return max(hits, key=lambda i: len(comps[i]))
+    return None
+
+
+def fieldNames(dataSet, components=None):
+    """
+    Returns a unique field name for each column of a data set: the canonical name
+    (see :func:`pyilt2.units.canonicalProp`), where composition columns (like ``x`` or ``w``)
+    get the number of their component (1, 2, ...), like ``x1``.
+    Uncertainty columns are named after their column, like ``Delta[x1]``.
+    Remaining duplicates get a suffix, like ``T_2``.
+
+    :param dataSet: data set
+    :type dataSet: :class:`pyilt2.dataset`
+    :param components: order of the components for the numbering (default: :attr:`pyilt2.dataset.listOfComp`)
+    :type components: list
+    :return: field names
+    :rtype: tuple
+    :raises ValueError: if *components* misses a component of a composition column
+    """
+    comps = list(dataSet.listOfComp)
+    order = list(components) if components is not None else comps
+    names = []
+    counts = {}
+    for prop in dataSet.physProps:
+        if prop.startswith('Delta['):
+            names.append('Delta[{0:s}]'.format(names[-1] if names else prop[6:-1]))
+            continue
+        name = units.canonicalProp(prop)
+        if name in compositionColumns:
+            i = _component(prop, comps)
+            if i is None:
+                # unknown component: number the columns in order of appearance
+                counts[name] = counts.get(name, 0) + 1
+                name += str(counts[name])
+            else:
+                if comps[i] not in order:
+                    raise ValueError('Component "{0:s}" of data set "{1:s}" is not in the given components!'.format(
+                        comps[i], dataSet.setid))
+                name += str(order.index(comps[i]) + 1)
+        if name in names:
+            k = 2
+            while '{0:s}_{1:d}'.format(name, k) in names:
+                k += 1
+            name = '{0:s}_{1:d}'.format(name, k)
+        names.append(name)
+    return tuple(names)
+
+
+def columns(dataSet, components=None):
+    """
+    Returns a structured view of :attr:`pyilt2.dataset.data` with the fields of :func:`fieldNames`
+    (all ``float64``). The view shares the memory with the data set, so no data is copied
+    (unless the data array is not C-contiguous) and changes of the view change the data set.
+
+    :param dataSet: data set
+    :type dataSet: :class:`pyilt2.dataset`
+    :param components: order of the components for the numbering of composition fields
+    :type components: list
+    :return: 1D structured array, one element per data point
+    :rtype: :class:`numpy.ndarray`
+    """
+    dtype = np.dtype([(name, np.float64) for name in fieldNames(dataSet, components)])
+    data = dataSet.data
+    if data.dtype != np.float64 or not data.flags.c_contiguous:
+        data = np.ascontiguousarray(data, dtype=np.float64)
+    return data.view(dtype).reshape(len(data))
+
+
+class batch(object):
+    """
+    Rows of many data sets stacked into one structured array, with the offsets of each data set (ragged layout).
+    The values are converted to SI units (see :mod:`pyilt2.units`); fields missing in a data set are NaN.
+
+    :param dataSets: data sets
+    :type dataSets: list of :class:`pyilt2.dataset`
+    :param components: common order of the components for the numbering of composition fields
+                       (default: as in each data set)
+    :type components: list
+    :param fields: fields to include (default: all fields of all data sets in order of appearance)
+    :type fields: list
+    """
+
+    def __init__(self, dataSets, components=None, fields=None):
+        names = [fieldNames(ds, components) for ds in dataSets]
+        if fields is None:
+            fields = []
+            for n in names:
+                fields.extend(f for f in n if f not in fields)
+        sizes = np.array([len(ds.data) for ds in dataSets], dtype=np.int64)
+        #: setids of the data sets
+        self.setids = tuple(ds.setid for ds in dataSets)
+        #: start of the rows of each data set in :attr:`values` (plus the total number of rows at the end)
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)])
+        #: SI units of the fields (*None* if unknown)
+        self.units = {}
+        #: stacked rows as 1D structured array
+        self.values = np.full(int(self.offsets[-1]), np.nan, dtype=[(f, np.float64) for f in fields])
+        for i, ds in enumerate(dataSets):
+            factors, offsets, siUnits = units.siPlan(ds.physProps, ds.physUnits)
+            rows = slice(self.offsets[i], self.offsets[i + 1])
+            for j, name in enumerate(names[i]):
+                if name in self.values.dtype.names:
+                    self.values[name][rows] = ds.data[:, j] * factors[j] + offsets[j]
+                    self.units.setdefault(name, siUnits[j])
+
+    def __len__(self):
+        return len(self.setids)
+
+    def __getitem__(self, i):
+        """Returns the rows of the *i*-th data set as a view of :attr:`values`."""
+        return self.values[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def fields(self):
+        """names of the fields"""
+        return self.values.dtype.names
+
+    @property
+    def sizes(self):
+        """number of rows of each data set"""
+        return np.diff(self.offsets)
+
+    @property
+    def index(self):
+        """index of the data set of each row"""
+        return np.repeat(np.arange(len(self.setids)), self.sizes)
+
+    def reduce(self, ufunc, field):
+        """
+        Reduces a field per data set by a ufunc, like ``b.reduce(np.add, 'T')``.
+        Data sets without rows give NaN.
+
+        :param ufunc: :mod:`numpy` ufunc, like :data:`numpy.add` or :data:`numpy.maximum`
+        :param field: field name
+        :type field: str
+        :rtype: :class:`numpy.ndarray`
+        """
+        sizes = self.sizes
+        out = np.full(len(sizes), np.nan)
+        full = sizes > 0
+        if full.any():
+            out[full] = ufunc.reduceat(self.values[field], self.offsets[:-1][full])
+        return out
+
+    def padded(self, field, fill=np.nan):
+        """
+        Returns a field as 2D array with one row per data set, padded with *fill* to the longest data set.
+
+        :param field: field name
+        :type field: str
+        :param fill: value for the padding
+        :type fill: float
+        :rtype: :class:`numpy.ndarray`
+        """
+        sizes = self.sizes
+        out = np.full((len(sizes), sizes.max() if len(sizes) else 0), fill)
+        out[np.arange(out.shape[1]) < sizes[:, None]] = self.values[field]
+        return out
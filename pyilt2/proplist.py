@@ -6,7 +6,7 @@ Physical properties
 Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
 """
 
-import requests
+from . import web
 
 prop2abr = {'Activity': 'a',
             'Adiabatic compressibility': 'kS',
@@ -73,7 +73,7 @@ class __abr2keyDict(dict):
     proplistUrl = 'https://ilthermo.boulder.nist.gov/ILT2/ilprpls'
 
     def __polulate(self):
-        r = requests.get(self.proplistUrl)
+        r = web.get(self.proplistUrl)
         prpDict = r.json()
         prpNames = []
         prpKeys = []
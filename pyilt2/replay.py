@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Record and replay of responses
+
+To run pipelines without network (e.g. in CI) or to reproduce a run exactly, all responses of the NIST server
+(searches, data sets, property list) and Crossref (:func:`pyilt2.report.citation2doi`)
+can be recorded into a single archive and replayed from it later:
+
+.. code-block:: py
+
+    from pyilt2 import replay
+
+    with replay.recording('run.zip'):
+        res = pyilt2.query(comp='bmim', prop='dens')
+        dataSets = [ref.get() for ref in res]
+
+    with replay.replaying('run.zip'):
+        res = pyilt2.query(comp='bmim', prop='dens')      # no network, no rate limit
+        dataSets = [ref.get() for ref in res]
+
+The archive is a zip file with one entry per request, named by the cache key of the request
+(see :meth:`pyilt2.web.responseCache.key`) and holding the compressed response
+(see :func:`pyilt2.web.encodeResponse`). So a lookup is a single dict access of the zip directory.
+During replay, a request which is not in the archive raises :class:`pyilt2.replay.replayError`.
+
+While recording, an error response of the server (status 5xx or 429) is only added to the archive
+if the request never succeeds, so a request which succeeds on retry is replayed with its successful response.
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import collections
+import contextlib
+import os
+import threading
+import zipfile
+
+from . import web
+from .web import encodeResponse, decodeResponse
+
+
+class replayError(Exception):
+    """Exception if a request is not in the archive during replay."""
+
+    def __init__(self, note):
+        self.msg = note
+
+    def __str__(self):
+        return repr(self.msg)
+
+
+class responseArchive(object):
+    """
+    Archive of responses, to be assigned to :attr:`pyilt2.web.requestScheduler.archive`.
+
+    :param filename: file name of the archive (zip)
+    :type filename: str
+    :param mode: ``'record'`` (requests go to the server and the responses are added to the archive)
+                 or ``'replay'`` (all responses are taken from the archive)
+    :type mode: str
+    """
+
+    def __init__(self, filename, mode='replay'):
+        if mode == 'record':
+            self._zip = zipfile.ZipFile(filename, 'a' if os.path.exists(filename) else 'w', zipfile.ZIP_STORED)
+        elif mode == 'replay':
+            self._zip = zipfile.ZipFile(filename, 'r')
+        else:
+            raise ValueError('Invalid mode "{0:s}"!'.format(str(mode)))
+        self.filename = filename
+        self.mode = mode
+        self._names = set(self._zip.namelist())
+        # last error responses (5xx, 429) of requests not (yet) succeeded, added to the archive on close
+        self._errors = {}
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+    def __len__(self):
+        return len(self._names)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fetch(self, key, send):
+        """
+        Returns the response for *key* from the archive (replay)
+        or requests it by ``send()`` and adds it to the archive (record).
+
+        :param key: cache key of the request, see :meth:`pyilt2.web.responseCache.key`
+        :type key: str
+        :param send: callable which sends the request and returns the :class:`requests.Response`
+        :rtype: :class:`requests.Response`
+        :raises pyilt2.replay.replayError: if the request is not in the archive during replay
+        """
+        if self.mode == 'replay':
+            if key not in self._names:
+                with self._lock:
+                    self._stats['misses'] += 1
+                raise replayError('Request "{0:s}" is not in the archive "{1:s}"!'.format(key, self.filename))
+            with self._lock:
+                self._stats['hits'] += 1
+                blob = self._zip.read(key)
+            r = decodeResponse(blob)
+            r.fromArchive = True
+            return r
+        r = send()
+        blob = encodeResponse(r)
+        with self._lock:
+            self._stats['recorded'] += 1
+            # zip entries can't be replaced, so the first response of a repeated request is kept
+            if key in self._names:
+                pass
+            elif r.status_code >= 500 or r.status_code == 429:
+                # a retry may still succeed
+                self._errors[key] = blob
+            else:
+                self._errors.pop(key, None)
+                self._names.add(key)
+                self._zip.writestr(key, blob)
+        return r
+
+    def stats(self):
+        """
+        Returns the number of entries and the hits, misses (replay) or recorded responses (record), like::
+
+            {'entries': 120, 'hits': 118, 'misses': 0, 'recorded': 0}
+
+        :rtype: dict
+        """
+        with self._lock:
+            out = dict(entries=len(self._names))
+            for k in ('hits', 'misses', 'recorded'):
+                out[k] = self._stats[k]
+        return out
+
+    def close(self):
+        """
+        Closes the archive. When recording, the error responses of requests which never succeeded are added
+        and the zip directory is written.
+        """
+        with self._lock:
+            if self._zip.fp is not None:
+                for key, blob in self._errors.items():
+                    self._names.add(key)
+                    self._zip.writestr(key, blob)
+            self._errors = {}
+            self._zip.close()
+
+
+@contextlib.contextmanager
+def _using(archive):
+    old = web.scheduler.archive
+    web.scheduler.archive = archive
+    try:
+        yield archive
+    finally:
+        web.scheduler.archive = old
+        archive.close()
+
+
+def recording(filename):
+    """
+    Context manager to record all responses into an archive (an existing archive is extended).
+
+    :param filename: file name of the archive (zip)
+    :type filename: str
+    :rtype: :class:`responseArchive`
+    """
+    return _using(responseArchive(filename, mode='record'))
+
+
+def replaying(filename):
+    """
+    Context manager to replay all responses from an archive.
+
+    :param filename: file name of the archive (zip)
+    :type filename: str
+    :rtype: :class:`responseArchive`
+    """
+    return _using(responseArchive(filename, mode='replay'))
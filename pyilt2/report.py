@@ -8,14 +8,25 @@ Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.p
 """
 
 from __future__ import print_function
-from . import (properties, prop2abr, abr2prop, query, __version__)
+from . import (properties, prop2abr, abr2prop, query, result, dataset, setIdError, web, __version__)
+from . import catalog as _catalog
+from . import replay
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
+import atexit
 import datetime
+import hashlib
+import io
+import json
+import locale
 import sys
+import tarfile
 import time
 import threading
 import os
-import requests
+import queue
+import shutil
+import zipfile
 
 # version of the search & report tool
 __prgversion__ = '1.1'
@@ -27,9 +38,15 @@ __prgdescrpt__ = 'A search and report tool for the ILThermo v2.0 database from N
 # ===============================================================================
 
 class Spinner:
-    """A class providing a spinning courser for cli tools."""
+    """A class providing a spinning courser for cli tools.
+
+    .. note::
+
+        The CLI uses :class:`Progress` now, which also handles concurrent requests.
+    """
     busy = False
     delay = 0.1
+    _thread = None
 
     @staticmethod
     def spinning_cursor():
@@ -50,18 +67,135 @@ class Spinner:
 
     def start(self):
         """Start the spinner."""
+        if self.busy:
+            return
         self.busy = True
-        threading.Thread(target=self.spinner_task).start()
+        self._thread = threading.Thread(target=self.spinner_task)
+        self._thread.daemon = True
+        self._thread.start()
 
     def stop(self):
         """Stop the spinner."""
         self.busy = False
-        time.sleep(self.delay)
+        if self._thread:
+            self._thread.join()
+            self._thread = None
 
 # create a spinner object for some of the following functions
 spinner = Spinner()
 
 
+def _wireBytes():
+    """Bytes received over the wire by the scheduler of :mod:`pyilt2.web` so far."""
+    return sum(host['bytes'] for host in web.scheduler.stats().values())
+
+
+class Progress:
+    """
+    A class to report the progress of many (concurrent) tasks for cli tools, like::
+
+        Request data sets [1200/2000] 3 failed, 4.1/s, 52.3 kB/s, ETA 0:03:15
+
+    All methods are thread-safe. On a terminal, one status line is redrawn by a single thread
+    at a fixed rate of :attr:`refresh` and messages of :meth:`log` are printed above it.
+    Otherwise (e.g. output to a file) the messages are printed as plain lines,
+    plus the status line every :attr:`logInterval` seconds.
+
+    :param label: description of the tasks
+    :type label: str
+    :param total: number of tasks (may be increased later by :meth:`add`)
+    :type total: int
+    :param stream: output stream (default: *stdout*)
+    """
+
+    #: seconds between redraws of the status line on a terminal
+    refresh = 0.25
+    #: seconds between status lines if the output is not a terminal
+    logInterval = 10.0
+
+    def __init__(self, label='', total=0, stream=None):
+        self.label = label
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.stream = stream or sys.stdout
+        self.tty = hasattr(self.stream, 'isatty') and self.stream.isatty()
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._bytes = _wireBytes()
+        self._lastLog = self._start
+        self._shown = ''
+        self._stop = threading.Event()
+        self._thread = None
+        if self.tty:
+            self._thread = threading.Thread(target=self._render)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def add(self, n=1):
+        """Adds *n* tasks to the total."""
+        with self._lock:
+            self.total += n
+
+    def done(self, ok=True):
+        """Marks a task as completed (or failed)."""
+        with self._lock:
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+            if not self.tty and time.monotonic() - self._lastLog >= self.logInterval:
+                self._lastLog = time.monotonic()
+                self.stream.write(self.status() + '\n')
+                self.stream.flush()
+
+    def log(self, msg):
+        """Prints a message."""
+        with self._lock:
+            if self.tty:
+                self.stream.write('\r' + ' ' * len(self._shown) + '\r')
+                self._shown = ''
+            self.stream.write(msg + '\n')
+            self.stream.flush()
+
+    def status(self):
+        """Returns the status line."""
+        elapsed = max(time.monotonic() - self._start, 1e-6)
+        finished = self.completed + self.failed
+        rate = finished / elapsed
+        out = '{0:s} [{1:d}/{2:d}]'.format(self.label, finished, self.total)
+        if self.failed:
+            out += ' {0:d} failed,'.format(self.failed)
+        out += ' {0:.1f}/s, {1:.1f} kB/s'.format(rate, (_wireBytes() - self._bytes) / elapsed / 1e3)
+        if rate > 0 and self.total > finished:
+            out += ', ETA {0:s}'.format(str(datetime.timedelta(seconds=int((self.total - finished) / rate))))
+        return out
+
+    def _draw(self):
+        line = self.status()
+        self.stream.write('\r' + line + ' ' * max(0, len(self._shown) - len(line)))
+        self.stream.flush()
+        self._shown = line
+
+    def _render(self):
+        while not self._stop.wait(self.refresh):
+            with self._lock:
+                self._draw()
+
+    def close(self):
+        """Stops the progress report and prints the final status line."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        with self._lock:
+            if self.tty:
+                self._draw()
+                self.stream.write('\n')
+            else:
+                self.stream.write(self.status() + '\n')
+            self.stream.flush()
+
+
 def printPropAbbrList():
     """
     Print a table, showing the physical properties which can be addressed in a query,
@@ -126,67 +260,221 @@ def metaDataStr(datObj):
     :return: meta data
     :rtype: str
     """
-    out =  'Property:\n  {0:s}\n'.format(datObj.setDict['title'].split(':')[-1].strip())
-    out += 'Reference:\n'
-    out += '  "{0:s}",\n'.format(datObj.setDict['ref']['title'])
-    out += '  {0:s}\n'.format(datObj.setDict['ref']['full'])
-    out += 'Component(s):\n'
-    for i in range(0, datObj.numOfComp):
-        out += '  {0:d}) {1:s}\n'.format(i+1, datObj.listOfComp[i])
-    if datObj.setDict['expmeth']:
-        out += 'Method: {0:s}\n'.format(datObj.setDict['expmeth'])
-    out += 'Phase(s): {0:s}\n'.format(', '.join(datObj.setDict['phases']))
-    if datObj.setDict['solvent']:
-        out += 'Solvent: {0:s}\n'.format(datObj.setDict['solvent'])
-    out += 'Data columns:\n'
-    for i in range(0, len(datObj.headerList)):
-        out += '  {0:d}) {1:s}\n'.format(i+1, datObj.headerList[i])
-    out += 'Data points: {0:d}\n'.format(datObj.np)
-    out += 'ILT2 setid: {0:s}\n'.format(datObj.setid)
-    return out
+    setDict = datObj.setDict
+    out = ['Property:\n  {0:s}\n'.format(setDict['title'].split(':')[-1].strip()),
+           'Reference:\n',
+           '  "{0:s}",\n'.format(setDict['ref']['title']),
+           '  {0:s}\n'.format(setDict['ref']['full']),
+           'Component(s):\n']
+    out += ['  {0:d}) {1:s}\n'.format(i + 1, comp) for i, comp in enumerate(datObj.listOfComp)]
+    if setDict['expmeth']:
+        out.append('Method: {0:s}\n'.format(setDict['expmeth']))
+    out.append('Phase(s): {0:s}\n'.format(', '.join(setDict['phases'])))
+    if setDict['solvent']:
+        out.append('Solvent: {0:s}\n'.format(setDict['solvent']))
+    out.append('Data columns:\n')
+    out += ['  {0:d}) {1:s}\n'.format(i + 1, col) for i, col in enumerate(datObj.headerList)]
+    out.append('Data points: {0:d}\n'.format(datObj.np))
+    out.append('ILT2 setid: {0:s}\n'.format(datObj.setid))
+    return ''.join(out)
 
 
-def writeReport(listOfDataSets, reportDir=None, resDOI=False, verbose=False):
-    dtnow = datetime.datetime.now()
-    if not reportDir:
-        reportDir = 'pyilt2report_' + dtnow.strftime("%Y-%m-%d_%H:%M:%S")
-    os.mkdir(reportDir)
-    if verbose:
-        print('\nWrite report to folder: '+reportDir)
-        print(' << report.txt')
-    rep = open(reportDir + '/report.txt', 'w')
-    rep.write(dtnow.strftime("%d. %b. %Y (%H:%M:%S)") + '\n')
-    rep.write('-' * 24 + '\n')
-    for i in range(0, len(listOfDataSets)):
-        dataSet = listOfDataSets[i]
+def formatData(datObj, fmt='%+1.8e', header=None):
+    """
+    Returns the data of an :class:`pyilt2.dataset` object as a *string*, exactly like
+    :meth:`pyilt2.dataset.write` writes it to a file. But instead of formatting row by row,
+    all values are formatted by a single format operation on the whole array.
+
+    :param datObj: dataset object
+    :type datObj: :class:`pyilt2.dataset`
+    :param fmt: format of a value, or sequence of formats (one per column)
+    :type fmt: str
+    :param header: header line (default from :attr:`pyilt2.dataset.headerList`)
+    :type header: str
+    :return: data block
+    :rtype: str
+    """
+    if not header:
+        header = datObj.headerLine
+    rows, cols = datObj.data.shape
+    if not isinstance(fmt, str):
+        rowFmt = ' '.join(fmt)
+    elif fmt.count('%') == 1:
+        rowFmt = ' '.join([fmt] * cols)
+    else:
+        rowFmt = fmt
+    out = '# ' + header.replace('\n', '\n# ') + '\n' if header else ''
+    return out + ((rowFmt + '\n') * rows) % tuple(datObj.data.ravel().tolist())
+
+
+class reportWriter:
+    """
+    A class to write a report folder (see :func:`writeReport`) while the data sets are still arriving.
+    Data sets handed over by :meth:`add` are queued and written by a background thread in the same order,
+    so the (slow) file output and DOI resolution overlap with requesting the next data sets.
+
+    :param reportDir: report folder (default: ``pyilt2report_<date>_<time>``)
+    :type reportDir: str
+    :param resDOI: try to resolve DOI from citation
+    :type resDOI: bool
+    :param verbose: Show messages and spinning cursor while waiting.
+    :type verbose: bool
+    :param archive: write the data files into a single archive ``data.tar`` or ``data.zip``
+                    (``'tar'`` or ``'zip'``) instead of separate files
+    :type archive: str
+    :param exist_ok: allow an existing report folder (e.g. when resuming a run)
+    :type exist_ok: bool
+    :param progress: print the messages by this progress report
+    :type progress: :class:`Progress`
+    :param catalog: also write the summaries of the data sets to ``catalog.npz`` (see :mod:`pyilt2.catalog`)
+    :type catalog: bool
+    """
+
+    def __init__(self, reportDir=None, resDOI=False, verbose=False, archive=None, exist_ok=False, progress=None,
+                 catalog=False):
+        dtnow = datetime.datetime.now()
+        if not reportDir:
+            reportDir = 'pyilt2report_' + dtnow.strftime("%Y-%m-%d_%H:%M:%S")
+        if not (exist_ok and os.path.isdir(reportDir)):
+            os.mkdir(reportDir)
+        self.reportDir = reportDir
+        self.resDOI = resDOI
+        self.verbose = verbose
+        self.setProgress(progress)
+        if verbose:
+            self._log('\nWrite report to folder: '+reportDir)
+            self._log(' << report.txt')
+        self._rep = open(os.path.join(reportDir, 'report.txt'), 'w', buffering=2**16)
+        self._rep.write(dtnow.strftime("%d. %b. %Y (%H:%M:%S)") + '\n')
+        self._rep.write('-' * 24 + '\n')
+        if archive == 'tar':
+            self._archive = tarfile.open(os.path.join(reportDir, 'data.tar'), 'w')
+        elif archive == 'zip':
+            self._archive = zipfile.ZipFile(os.path.join(reportDir, 'data.zip'), 'w', zipfile.ZIP_DEFLATED)
+        elif archive:
+            raise ValueError('Invalid archive type "{0:s}"!'.format(archive))
+        else:
+            self._archive = None
+        self._catalog = _catalog.catalog() if catalog else None
+        self._count = 0
+        self._error = None
+        self._queue = queue.Queue(maxsize=64)
+        self._thread = threading.Thread(target=self._work)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def setProgress(self, progress):
+        """
+        Prints the messages by a progress report, so that they don't break its status line.
+
+        :param progress: progress report, or *None* to print the messages directly
+        :type progress: :class:`Progress`
+        """
+        self._log = progress.log if progress else print
+
+    def add(self, dataSet):
+        """
+        Queues a data set for writing as the next reference.
+
+        :param dataSet: data set
+        :type dataSet: :class:`pyilt2.dataset`
+        """
+        if self._error:
+            raise self._error
+        self._queue.put((self._count, dataSet))
+        self._count += 1
+
+    def close(self):
+        """
+        Waits until all queued data sets are written and closes the files.
+
+        :return: report folder
+        :rtype: str
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._rep.close()
+        if self._archive:
+            self._archive.close()
+        if self._catalog is not None and self._error is None:
+            self._catalog.save(os.path.join(self.reportDir, 'catalog.npz'))
+        if self._error:
+            raise self._error
+        return self.reportDir
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if self._error is None:
+                try:
+                    self._write(*item)
+                except Exception as e:
+                    self._error = e
+
+    def _writeData(self, dataFile, block):
+        if isinstance(self._archive, tarfile.TarFile):
+            raw = block.encode(locale.getpreferredencoding(False))
+            info = tarfile.TarInfo(dataFile)
+            info.size = len(raw)
+            info.mtime = time.time()
+            self._archive.addfile(info, io.BytesIO(raw))
+        elif self._archive:
+            self._archive.writestr(dataFile, block.encode(locale.getpreferredencoding(False)))
+        else:
+            with open(os.path.join(self.reportDir, dataFile), 'w') as fp:
+                fp.write(block)
+
+    def _write(self, i, dataSet):
         dataFile = 'ref{0:d}.dat'.format(i)
         # write data file
-        dataSet.write(reportDir + '/' + dataFile)
-        if verbose:
-            print(' << {0:s} [{1:s}]'.format(dataFile, dataSet.setid))
+        self._writeData(dataFile, formatData(dataSet))
+        if self._catalog is not None:
+            self._catalog.add(dataSet)
+        if self.verbose:
+            self._log(' << {0:s} [{1:s}]'.format(dataFile, dataSet.setid))
         # write meta data to report file
-        rep.write('\nRef. #{0:d}\n'.format(i, dataSet.setid))
-        rep.write('=' * 10 + '\n')
-        rep.write( metaDataStr(dataSet) )
-        if resDOI:
-            if verbose:
-                print(' >> resolve DOI ... ', end='')
-                spinner.start()
+        rep = ['\nRef. #{0:d}\n'.format(i), '=' * 10 + '\n', metaDataStr(dataSet)]
+        if self.resDOI:
             try:
                 (doi, url, score) = citation2doi(dataSet.fullcite)
             except:
-                if verbose:
-                    spinner.stop()
                 e = sys.exc_info()[1]
-                print('Error: {0:s}'.format(str(e)))
+                self._log(' >> resolve DOI [{0:s}] ... Error: {1:s}'.format(dataSet.setid, str(e)))
             else:
-                if verbose:
-                    spinner.stop()
-                    print('\b {0:s} (score: {1:f}) done!'.format(doi, score))
-                rep.write('DOI: {0:s} (score: {1:f})\n'.format(doi, score))
-                rep.write('URL: {0:s}\n'.format(url))
-    rep.close()
-    return reportDir
+                if self.verbose:
+                    self._log(' >> resolve DOI [{0:s}] ... {1:s} (score: {2:f}) done!'.format(
+                        dataSet.setid, doi, score))
+                rep.append('DOI: {0:s} (score: {1:f})\n'.format(doi, score))
+                rep.append('URL: {0:s}\n'.format(url))
+        self._rep.write(''.join(rep))
+
+
+def writeReport(listOfDataSets, reportDir=None, resDOI=False, verbose=False, archive=None, catalog=False):
+    """
+    Writes a report folder with the meta data of all data sets in ``report.txt``
+    and the data of each data set in ``ref<i>.dat`` (see :class:`reportWriter`).
+
+    :param listOfDataSets: data sets
+    :type listOfDataSets: list of :class:`pyilt2.dataset`
+    :param reportDir: report folder (default: ``pyilt2report_<date>_<time>``)
+    :type reportDir: str
+    :param resDOI: try to resolve DOI from citation
+    :type resDOI: bool
+    :param verbose: Show messages and spinning cursor while waiting.
+    :type verbose: bool
+    :param archive: ``'tar'`` or ``'zip'`` to write the data files into a single archive
+    :type archive: str
+    :param catalog: also write the summaries of the data sets to ``catalog.npz`` (see :mod:`pyilt2.catalog`)
+    :type catalog: bool
+    :return: report folder
+    :rtype: str
+    """
+    writer = reportWriter(reportDir, resDOI=resDOI, verbose=verbose, archive=archive, catalog=catalog)
+    for dataSet in listOfDataSets:
+        writer.add(dataSet)
+    return writer.close()
 
 
 def doicache( func ):
@@ -224,7 +512,7 @@ def citation2doi( citation ):
     """
     url = 'https://api.crossref.org/works'
     payload = {'query.bibliographic': citation}
-    r = requests.get(url, params=payload)
+    r = web.get(url, params=payload)
     r = r.json()['message']['items'][0]
     return ( r['DOI'], r['URL'], r['score'] )
 
@@ -232,7 +520,7 @@ def citation2doi( citation ):
 def cliQuery(comp='', numOfComp=0, year='', author='', keywords='', prop='', verbose=True):
     """
     This is a wapper function for :func:`pyilt2.query` which is suitable for cli tools.
-    It shows a spinning cursor while waiting for the answer from the web server and includes error handling.
+    It shows messages while waiting for the answer from the web server and includes error handling.
 
     :param comp: Chemical formula (case-sensitive), CAS registry number, or name (part or full)
     :type comp: str
@@ -246,7 +534,7 @@ def cliQuery(comp='', numOfComp=0, year='', author='', keywords='', prop='', ver
     :type keywords: str
     :param prop: Physical property by abbreviation. Default '' means *unspecified*.
     :type prop: str
-    :param verbose: Show messages and spinning cursor while waiting.
+    :param verbose: Show messages while waiting.
     :type verbose: bool
     :return: result object
     :rtype: :class:`pyilt2.result`
@@ -254,7 +542,7 @@ def cliQuery(comp='', numOfComp=0, year='', author='', keywords='', prop='', ver
     resObj=None
     if verbose:
         print('Make query to NIST... ', end='')
-        spinner.start()
+        sys.stdout.flush()
     try:
         resObj = query(comp=comp,
                               numOfComp=numOfComp,
@@ -263,50 +551,421 @@ def cliQuery(comp='', numOfComp=0, year='', author='', keywords='', prop='', ver
                               keywords=keywords,
                               prop=prop)
     except:
-        if verbose:
-            spinner.stop()
         e = sys.exc_info()[1]
         print('Error: {0:s}'.format(str(e)))
         exit(1)
     else:
         if verbose:
-            spinner.stop()
-            print('\b done! ({0:d} hits)'.format(len(resObj)))
+            print('done! ({0:d} hits)'.format(len(resObj)))
     return resObj
 
 
-def getAllData(resObj, verbose=False):
+class Checkpoint:
+    """
+    A class to persist the data sets of a report run as they arrive, so that an aborted run can be resumed.
+
+    The checkpoint folder contains each downloaded data set as ``<setid>.json``, a ``manifest.json``
+    with the query result (written once), and the append-only logs ``done.log`` (one setid per line)
+    and ``failed.log`` (one JSON list ``[setid, note]`` per line) of completed and failed data sets.
+    Data sets are written to a temporary file first and renamed afterwards,
+    so a killed process never leaves a truncated file behind; an incomplete last log line is ignored.
+
+    :param dirname: checkpoint folder
+    :type dirname: str
+    """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+        self.manifest = {}
+        #: setids of the completed data sets
+        self.done = set()
+        #: dict with the setid as *key* and the error message as *value* for failed data sets
+        self.failed = {}
+
+    def _path(self, fname):
+        return os.path.join(self.dirname, fname)
+
+    def _dump(self, obj, fname):
+        tmp = self._path(fname + '.tmp')
+        with open(tmp, 'w') as fp:
+            json.dump(obj, fp)
+        os.replace(tmp, self._path(fname))
+
+    def _append(self, fname, line):
+        with open(self._path(fname), 'a') as fp:
+            fp.write(line + '\n')
+
+    def _readLog(self, fname):
+        try:
+            with open(self._path(fname)) as fp:
+                return [line[:-1] for line in fp if line.endswith('\n')]
+        except IOError:
+            return []
+
+    def exists(self):
+        """Returns *True* if the checkpoint folder contains a manifest."""
+        return os.path.isfile(self._path('manifest.json'))
+
+    def start(self, resObj, query=None, reportDir=None):
+        """
+        Creates the checkpoint folder and the manifest for a new run.
+
+        :param resObj: result object of the run
+        :type resObj: :class:`pyilt2.result`
+        :param query: search options of the run, to check them when resuming
+        :type query: dict
+        :param reportDir: report folder of the run, to continue writing there when resuming
+        :type reportDir: str
+        :raises OSError: if the checkpoint folder already exists (e.g. created by a concurrent run)
+        """
+        os.mkdir(self.dirname)
+        self.manifest = {'resDict': resObj.resDict, 'query': query, 'reportDir': reportDir}
+        self.done = set()
+        self.failed = {}
+        self._dump(self.manifest, 'manifest.json')
+
+    def load(self):
+        """
+        Loads the manifest and the logs of a previous run.
+
+        :return: result object of the previous run
+        :rtype: :class:`pyilt2.result`
+        """
+        with open(self._path('manifest.json')) as fp:
+            self.manifest = json.load(fp)
+        self.done = set(self._readLog('done.log'))
+        self.failed = {}
+        for line in self._readLog('failed.log'):
+            setid, note = json.loads(line)
+            self.failed[setid] = note
+        for setid in self.done:
+            self.failed.pop(setid, None)
+        return result(self.manifest['resDict'])
+
+    def isDone(self, setid):
+        """Returns *True* if the data set was already downloaded."""
+        return setid in self.done
+
+    def save(self, dataSet):
+        """Persists a data set and marks it as completed."""
+        self._dump(dataSet.setDict, dataSet.setid + '.json')
+        self._append('done.log', dataSet.setid)
+        self.done.add(dataSet.setid)
+        self.failed.pop(dataSet.setid, None)
+
+    def fail(self, setid, note):
+        """Marks a data set as failed."""
+        self._append('failed.log', json.dumps([setid, note]))
+        self.failed[setid] = note
+
+    def get(self, setid):
+        """
+        Returns a persisted data set.
+
+        :rtype: :class:`pyilt2.dataset`
+        """
+        with open(self._path(setid + '.json')) as fp:
+            return dataset(setid, setDict=json.load(fp))
+
+    def remove(self):
+        """Removes the checkpoint folder."""
+        shutil.rmtree(self.dirname)
+
+
+def checkpointDir(reportDir, query):
+    """
+    Returns the checkpoint folder of a report run: ``<reportDir>.partial``, or if no report folder is given
+    ``pyilt2report_<hash>.partial`` with a hash of the search options, so that different searches
+    started in the same working directory don't share a checkpoint.
+
+    :param reportDir: report folder (or *None*)
+    :type reportDir: str
+    :param query: search options, as keyword arguments of :func:`pyilt2.query`
+    :type query: dict
+    :rtype: str
+    """
+    if reportDir:
+        return reportDir.rstrip(os.sep) + '.partial'
+    digest = hashlib.sha1(json.dumps(query, sort_keys=True).encode('utf-8')).hexdigest()
+    return 'pyilt2report_{0:s}.partial'.format(digest[:10])
+
+
+def getAllData(resObj, verbose=False, checkpoint=None, retries=0, onError='abort', writer=None):
     """
     Requests the data sets for all references of a :class:`pyilt2.result`
     object and returns them as a list.
 
     :param resObj: A result object
     :type resObj:  :class:`pyilt2.result`
-    :param verbose: Show messages and spinning cursor while waiting.
+    :param verbose: Show messages and the progress while waiting.
+    :param checkpoint: persist each data set as it arrives and skip those already downloaded
+    :type checkpoint: :class:`Checkpoint`
+    :param retries: number of retries for a failed request
+    :type retries: int
+    :param onError: policy if a data set still fails after all retries,
+                    ``'abort'`` exits the program (the checkpoint is kept),
+                    ``'skip'`` leaves it out of the list
+    :type onError: str
+    :param writer: hand each data set over to this writer as soon as it arrives
+    :type writer: :class:`reportWriter`
     :return: List of :class:`pyilt2.dataset` objects
     """
     dataSets = []
     if verbose:
         print('\nRequest data sets from NIST:')
+        progress = Progress('Request data sets', total=len(resObj))
+        if writer:
+            writer.setProgress(progress)
     for i in range(0, len(resObj)):
-        if verbose:
-            print(' >> {0:s} [{1:s}] ... '.format(resObj[i].ref, resObj[i].setid), end='')
-            spinner.start()
-        try:
-            dataSets.append(resObj[i].get())
-        except:
+        if checkpoint and checkpoint.isDone(resObj[i].setid):
+            dataSets.append(checkpoint.get(resObj[i].setid))
+            if writer:
+                writer.add(dataSets[-1])
             if verbose:
-                spinner.stop()
-            e = sys.exc_info()[1]
-            print('Error: {0:s}'.format(str(e)))
-            exit(1)
-        else:
+                progress.log(' >> {0:s} [{1:s}] ... done! (checkpoint)'.format(resObj[i].ref, resObj[i].setid))
+                progress.done()
+            continue
+        for attempt in range(0, retries + 1):
+            try:
+                dataSet = resObj[i].get()
+            except setIdError as err:
+                # an invalid setid stays invalid, so don't retry
+                e = err
+                break
+            except Exception as err:
+                e = err
+                if attempt < retries:
+                    time.sleep(attempt + 1)
+            else:
+                e = None
+                break
+        if e is not None:
+            msg = ' >> {0:s} [{1:s}] ... Error: {2:s}'.format(resObj[i].ref, resObj[i].setid, str(e))
             if verbose:
-                spinner.stop()
-                print('\b done!')
+                progress.log(msg)
+                progress.done(ok=False)
+            else:
+                print(msg)
+            if checkpoint:
+                checkpoint.fail(resObj[i].setid, str(e))
+            if onError != 'skip':
+                if verbose:
+                    if writer:
+                        writer.setProgress(None)
+                    progress.close()
+                exit(1)
+            continue
+        if checkpoint:
+            checkpoint.save(dataSet)
+        dataSets.append(dataSet)
+        if writer:
+            writer.add(dataSet)
+        if verbose:
+            progress.log(' >> {0:s} [{1:s}] ... done!'.format(resObj[i].ref, resObj[i].setid))
+            progress.done()
+    if verbose:
+        if writer:
+            writer.setProgress(None)
+        progress.close()
     return dataSets
 
 
+#: keys of a job spec which are passed to :func:`pyilt2.query`
+jobKeys = ('comp', 'numOfComp', 'year', 'author', 'keywords', 'prop')
+
+
+def readJobFile(filename):
+    """
+    Reads a job file for the batch mode and returns a list of job specs (dicts).
+    Depending on the file extension the file is read as JSON (``.json``, default),
+    JSON lines (``.jsonl``, one job per line) or YAML (``.yaml``, ``.yml``, requires *PyYAML*).
+    The JSON and YAML files may contain either a list of jobs or a dict with the list as ``jobs``.
+    Each job accepts the keys of :data:`jobKeys` as search options and an optional ``name``
+    (used as folder name, so without path separators), like::
+
+        [{"name": "emim_scn", "comp": "1-ethyl-3-methylimidazolium thiocyanate", "numOfComp": 1},
+         {"name": "roemer2018", "author": "Roemer", "year": "2018"}]
+
+    :param filename: job file name
+    :type filename: str
+    :return: list of job specs with the ``name`` key set
+    :rtype: list
+    :raises ValueError: if the job file is invalid
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    with open(filename) as fp:
+        if ext == '.jsonl':
+            jobs = [json.loads(line) for line in fp if line.strip()]
+        elif ext in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ValueError('Reading YAML job files requires the PyYAML package!')
+            jobs = yaml.safe_load(fp)
+        else:
+            jobs = json.load(fp)
+    if isinstance(jobs, dict):
+        jobs = jobs.get('jobs')
+    if not isinstance(jobs, list) or len(jobs) == 0:
+        raise ValueError('No jobs found in "{0:s}"!'.format(filename))
+    names = set()
+    for i in range(0, len(jobs)):
+        job = jobs[i]
+        if not isinstance(job, dict):
+            raise ValueError('Job #{0:d} is not a mapping!'.format(i))
+        unknown = set(job.keys()) - set(jobKeys) - {'name'}
+        if unknown:
+            raise ValueError('Job #{0:d} has unknown key(s): {1:s}'.format(i, ', '.join(sorted(unknown))))
+        if not any(job.get(k) for k in jobKeys):
+            raise ValueError('Job #{0:d} defines no search option!'.format(i))
+        job['name'] = str(job.get('name') or 'job{0:d}'.format(i))
+        # the name is used as folder name within the output folder
+        if job['name'] in ('.', '..') or '/' in job['name'] or '\\' in job['name'] or os.sep in job['name']:
+            raise ValueError('Job name "{0:s}" must not contain a path!'.format(job['name']))
+        if job['name'] in names:
+            raise ValueError('Job name "{0:s}" is not unique!'.format(job['name']))
+        names.add(job['name'])
+    return jobs
+
+
+def _bulk(flow, func, *args, **kwargs):
+    """Calls ``func(*args, **kwargs)`` with the requests scheduled as bulk traffic (see :func:`pyilt2.web.priority`)."""
+    with web.priority(web.BULK, flow=flow):
+        return func(*args, **kwargs)
+
+
+def fetchDataSets(setids, workers=4, verbose=False):
+    """
+    Requests the data sets for a list of setids concurrently (as bulk traffic, see :mod:`pyilt2.web`).
+    Each setid is requested only once, even if it appears multiple times in the list.
+
+    :param setids: NIST setids (hashes)
+    :type setids: list
+    :param workers: number of concurrent requests
+    :type workers: int
+    :param verbose: Show a message for each finished data set.
+    :return: dict with the setid as *key* and a :class:`pyilt2.dataset` object
+             (or the exception raised while requesting it) as *value*
+    :rtype: dict
+    """
+    out = {}
+    uniq = list(dict.fromkeys(setids))
+    if verbose:
+        progress = Progress('Request data sets', total=len(uniq))
+    web.setPoolSize(workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_bulk, 'fetchDataSets', dataset, setid): setid for setid in uniq}
+        for future in as_completed(futures):
+            setid = futures[future]
+            try:
+                out[setid] = future.result()
+            except Exception as e:
+                out[setid] = e
+                if verbose:
+                    progress.log(' >> {0:s} Error: {1:s}'.format(setid, str(e)))
+                    progress.done(ok=False)
+            else:
+                if verbose:
+                    progress.done()
+    if verbose:
+        progress.close()
+    return out
+
+
+def runBatch(jobs, batchDir=None, resDOI=False, workers=4, verbose=False, archive=None, catalog=False):
+    """
+    Runs many searches within one process and writes a report folder (see :func:`writeReport`)
+    for each job plus a ``summary.txt`` to ``batchDir``.
+    All queries and data set requests share the connection pool of :data:`pyilt2.session`,
+    and data sets which are referenced by several jobs are requested only once.
+
+    :param jobs: job specs, like returned by :func:`readJobFile`
+    :type jobs: list
+    :param batchDir: output folder (default: ``pyilt2batch_<date>_<time>``)
+    :type batchDir: str
+    :param resDOI: try to resolve DOI from citation
+    :type resDOI: bool
+    :param workers: number of concurrent requests
+    :type workers: int
+    :param verbose: Show progress messages.
+    :param archive: ``'tar'`` or ``'zip'`` to write the data files of each report into a single archive
+    :type archive: str
+    :param catalog: also write the summaries of the data sets of each report to ``catalog.npz``
+    :type catalog: bool
+    :return: output folder
+    :rtype: str
+    """
+    dtnow = datetime.datetime.now()
+    if not batchDir:
+        batchDir = 'pyilt2batch_' + dtnow.strftime("%Y-%m-%d_%H:%M:%S")
+    os.mkdir(batchDir)
+
+    # run all queries
+    if verbose:
+        progress = Progress('Make queries to NIST', total=len(jobs))
+    web.setPoolSize(workers)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_bulk, job['name'], query, **{k: job[k] for k in jobKeys if k in job})
+                   for job in jobs]
+        results = []
+        for job, future in zip(jobs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+                if verbose:
+                    progress.log(' >> {0:s} Error: {1:s}'.format(job['name'], str(e)))
+                    progress.done(ok=False)
+            else:
+                if verbose:
+                    progress.log(' >> {0:s} done! ({1:d} hits)'.format(job['name'], len(results[-1])))
+                    progress.done()
+    if verbose:
+        progress.close()
+
+    # request each data set only once
+    setids = [ref.setid for res in results if not isinstance(res, Exception) for ref in res.refs]
+    if verbose:
+        print('\nRequest {0:d} data sets from NIST ({1:d} references):'.format(len(set(setids)), len(setids)))
+    dataSets = fetchDataSets(setids, workers=workers, verbose=verbose)
+
+    # write one report per job and the summary
+    if verbose:
+        print('\nWrite reports to folder: ' + batchDir)
+    summ = open(os.path.join(batchDir, 'summary.txt'), 'w')
+    summ.write(dtnow.strftime("%d. %b. %Y (%H:%M:%S)") + '\n')
+    summ.write('-' * 24 + '\n')
+    for job, res in zip(jobs, results):
+        summ.write('\nJob: {0:s}\n'.format(job['name']))
+        summ.write('=' * 10 + '\n')
+        for k in jobKeys:
+            if job.get(k):
+                summ.write('{0:s}: {1:s}\n'.format(k, str(job[k])))
+        if isinstance(res, Exception):
+            summ.write('Error: {0:s}\n'.format(str(res)))
+            continue
+        good = [dataSets[ref.setid] for ref in res.refs if not isinstance(dataSets[ref.setid], Exception)]
+        failed = [ref.setid for ref in res.refs if isinstance(dataSets[ref.setid], Exception)]
+        summ.write('Hits: {0:d}\n'.format(len(res)))
+        try:
+            reportDir = writeReport(good, reportDir=os.path.join(batchDir, job['name']), resDOI=resDOI,
+                                    archive=archive, catalog=catalog)
+        except Exception as e:
+            # one failed report must not cost the other jobs of the batch
+            summ.write('Error: {0:s}\n'.format(str(e)))
+            if verbose:
+                print(' << {0:s} Error: {1:s}'.format(job['name'], str(e)))
+            continue
+        if verbose:
+            print(' << {0:s} ({1:d} data sets)'.format(reportDir, len(good)))
+        summ.write('Data sets: {0:d}\n'.format(len(good)))
+        summ.write('Report: {0:s}\n'.format(reportDir))
+        for setid in failed:
+            summ.write('Failed: {0:s} ({1:s})\n'.format(setid, str(dataSets[setid])))
+    summ.close()
+    return batchDir
+
+
 def _getArgParser():
     """Argument parser for pyilt2report cli tool."""
     parser = argparse.ArgumentParser(description=__prgdescrpt__,
@@ -331,6 +990,26 @@ def _getArgParser():
                         help='dont ask if to proceed creating report', default=False)
     parser.add_argument('--props', action='store_true',
                         help='show properties abbreviations and exit', default=False)
+    parser.add_argument('--resume', action='store_true',
+                        help='resume an aborted run (same search options or -o) from its checkpoint folder', default=False)
+    parser.add_argument('--retries', type=int, metavar='2',
+                        help='number of retries for a failed data set request. Default: 2', default=2)
+    parser.add_argument('--on-error', type=str, choices=['abort', 'skip'],
+                        help='what to do if a data set request still fails. Default: abort', default='abort')
+    parser.add_argument('--archive', type=str, choices=['tar', 'zip'],
+                        help='write the data files into a single archive file', default=None)
+    parser.add_argument('--catalog', action='store_true',
+                        help='also write the summaries of the data sets to catalog.npz in the report folder')
+    parser.add_argument('--record', type=str, metavar='file',
+                        help='record all responses into this archive (zip)', default=None)
+    parser.add_argument('--replay', type=str, metavar='file',
+                        help='replay all responses from this archive (zip) without network', default=None)
+    parser.add_argument('--http-cache', type=str, metavar='dir',
+                        help='keep responses in this folder and revalidate them by conditional requests', default=None)
+    parser.add_argument('--batch', type=str, metavar='file',
+                        help='run all searches of a job file (json, jsonl or yaml) and exit', default=None)
+    parser.add_argument('-j', '--workers', type=int, metavar='4',
+                        help='number of concurrent requests in batch mode. Default: 4', default=4)
     parser.add_argument('--version', action='version',
                         version="%(prog)s " + __prgversion__ + " (pyilt2 " + __version__ + ")")
     return parser
@@ -351,6 +1030,38 @@ def run():
         printPropAbbrList()
         exit(0)
 
+    # local copies of responses for conditional requests (option: --http-cache)
+    if args.http_cache:
+        web.scheduler.cache = web.responseCache(args.http_cache)
+
+    # record or replay all responses (options: --record, --replay)
+    if args.record or args.replay:
+        if args.record and args.replay:
+            print('Error! Use either --record or --replay.')
+            exit(1)
+        try:
+            web.scheduler.archive = replay.responseArchive(args.record or args.replay,
+                                                          mode='record' if args.record else 'replay')
+        except (IOError, ValueError) as e:
+            print('Error! {0:s}'.format(str(e)))
+            exit(1)
+        atexit.register(web.scheduler.archive.close)
+
+    # run searches of a job file and exit (option: --batch)
+    if args.batch:
+        if args.workers < 1:
+            print('Error! The number of workers must be at least 1.')
+            exit(1)
+        try:
+            jobs = readJobFile(args.batch)
+        except (IOError, ValueError) as e:
+            print('Error! {0:s}'.format(str(e)))
+            exit(1)
+        runBatch(jobs, batchDir=args.out, resDOI=args.doi, workers=args.workers, verbose=True,
+                 archive=args.archive, catalog=args.catalog)
+        print('pyilt2report finished!')
+        exit(0)
+
     # check the 'phys. property' search option
     sprop = ''
     if args.p:
@@ -359,26 +1070,62 @@ def run():
             exit(1)
         else:
             sprop = args.p
+    params = dict(comp=args.c, numOfComp=args.n, year=args.y, author=args.a, keywords=args.k, prop=sprop)
 
-    # makes the request to the NIST database
-    res = cliQuery(comp=args.c, numOfComp=args.n, year=args.y,
-                   author=args.a, keywords=args.k, prop=sprop, verbose=True)
-
-    # show results and ask if to proceed
-    printResultTable(res)
-    if not args.auto:
-        print('\nProceed? [Y]/n  ', end='')
-        answ = sys.stdin.readline().strip()
-        if answ not in ['', 'y', 'Y']:
-            print('Abort by user!')
+    # data sets are persisted as they arrive, so an aborted run can be resumed (option: --resume)
+    checkpoint = Checkpoint(checkpointDir(args.out, params))
+    if args.resume:
+        if not checkpoint.exists():
+            print('Error! Nothing to resume in "{0:s}" (use the search options or -o of the aborted run).'.format(
+                checkpoint.dirname))
+            exit(1)
+        res = checkpoint.load()
+        stored = checkpoint.manifest.get('query')
+        given = {k: v for k, v in params.items() if v}
+        if stored is not None and given and given != {k: v for k, v in stored.items() if v}:
+            print('Error! The search options differ from those of the checkpoint "{0:s}".'.format(checkpoint.dirname))
+            exit(1)
+        reportDir = args.out or checkpoint.manifest.get('reportDir')
+        print('Resume from "{0:s}" ({1:d} of {2:d} data sets done)'.format(
+            checkpoint.dirname, len(checkpoint.done), len(res)))
+    else:
+        if checkpoint.exists():
+            print('Error! Found checkpoint "{0:s}", use --resume or remove it.'.format(checkpoint.dirname))
             exit(1)
 
-    # get full data sets for _all_ references
-    dataSets = getAllData(res, verbose=True)
+        # makes the request to the NIST database
+        res = cliQuery(verbose=True, **params)
 
-    # write report
-    dname = writeReport(dataSets, verbose=True, resDOI=args.doi, reportDir=args.out)
-    # print('\nReport written to ' + dname)
+        # show results and ask if to proceed
+        printResultTable(res)
+        if not args.auto:
+            print('\nProceed? [Y]/n  ', end='')
+            answ = sys.stdin.readline().strip()
+            if answ not in ['', 'y', 'Y']:
+                print('Abort by user!')
+                exit(1)
+        reportDir = args.out or 'pyilt2report_' + datetime.datetime.now().strftime("%Y-%m-%d_%H:%M:%S")
+        try:
+            checkpoint.start(res, query=params, reportDir=reportDir)
+        except OSError as e:
+            print('Error! Can\'t create checkpoint "{0:s}": {1:s}'.format(checkpoint.dirname, str(e)))
+            exit(1)
+
+    # get full data sets for _all_ references, the report is written meanwhile
+    writer = reportWriter(reportDir, resDOI=args.doi, archive=args.archive, exist_ok=args.resume,
+                          catalog=args.catalog)
+    getAllData(res, verbose=True, checkpoint=checkpoint,
+               retries=args.retries, onError=args.on_error, writer=writer)
+    dname = writer.close()
+    if checkpoint.failed:
+        # keep the checkpoint, so that the skipped data sets can be requested later
+        print('\nSkipped data sets:')
+        for setid, note in sorted(checkpoint.failed.items()):
+            print(' >> [{0:s}] {1:s}'.format(setid, note))
+        print('Run again with --resume (and the same search options or -o) to request them.')
+    else:
+        checkpoint.remove()
+    print('\nReport written to folder: ' + dname)
     print('pyilt2report finished!')
 
 # Script entry point
@@ -0,0 +1,393 @@
+# -*- coding: utf-8 -*-
+"""
+Shared cache for several processes
+
+If pyilt2 runs in many processes at once (like the workers of a web server), each of them starts with a cold
+:class:`pyilt2.cache.datasetCache` and :class:`pyilt2.web.responseCache`.
+A :class:`cacheServer` is a small local daemon, which keeps the responses of the NIST server
+(searches, data sets, property list) and Crossref for all processes in memory,
+encoded by :func:`pyilt2.web.encodeResponse`.
+Concurrent requests for a missing response are coalesced across the processes:
+only the first one goes to the server, the others wait for its response.
+
+Start the daemon (by default on the Unix socket :data:`defaultAddress`)::
+
+    $ pyilt2cache --max-mb 512
+
+and connect each process to it by a :class:`cacheClient`:
+
+.. code-block:: py
+
+    from pyilt2 import web, sharedcache
+
+    web.scheduler.shared = sharedcache.cacheClient()
+
+The Unix socket is only accessible by the user who started the daemon (mode 0600, in a folder with mode 0700).
+A localhost TCP address (``host:port``) is accessible by all users of the machine, so use it only on a machine
+you don't share. A client may only store a response for a request it got a miss for, so it can't
+replace the responses of the others.
+If the daemon isn't running (or dies), the requests go directly to the server.
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import argparse
+import collections
+import json
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+from .web import encodeResponse, decodeResponse
+
+#: default address of the daemon (a Unix socket in the cache folder of the user)
+defaultAddress = os.path.join('~', '.cache', 'pyilt2', 'cache.sock')
+
+# frame: operation (1 byte), key length (2 bytes), payload length (4 bytes)
+_frame = struct.Struct('!cHI')
+_GET, _PUT, _RELEASE, _STATS = b'G', b'P', b'R', b'S'
+_HIT, _MISS, _OK, _DENIED = b'H', b'M', b'K', b'D'
+
+
+def parseAddress(address):
+    """
+    Parses the address of the daemon: a path of a Unix socket (contains a ``/``, ``~`` is expanded)
+    or ``host:port``.
+
+    :param address: address
+    :type address: str
+    :return: ``(family, address)`` as used by :mod:`socket`
+    :rtype: tuple
+    """
+    if '/' in address:
+        return socket.AF_UNIX, os.path.expanduser(address)
+    host, _, port = address.rpartition(':')
+    return socket.AF_INET, (host or 'localhost', int(port))
+
+
+def _recvall(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError('connection closed')
+        buf += chunk
+    return bytes(buf)
+
+
+def _send(sock, op, key=b'', payload=b''):
+    sock.sendall(_frame.pack(op, len(key), len(payload)) + key + payload)
+
+
+def _recv(sock):
+    op, keyLen, size = _frame.unpack(_recvall(sock, _frame.size))
+    key = _recvall(sock, keyLen) if keyLen else b''
+    return op, key, _recvall(sock, size) if size else b''
+
+
+class _handler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        store = self.server.store
+        owned = set()
+        try:
+            while True:
+                try:
+                    op, key, payload = _recv(self.request)
+                except (EOFError, OSError):
+                    return
+                if op == _GET:
+                    blob = store.lookup(key)
+                    if blob is None:
+                        owned.add(key)
+                        _send(self.request, _MISS)
+                    else:
+                        _send(self.request, _HIT, payload=blob)
+                elif op in (_PUT, _RELEASE):
+                    # only the client which got the miss may fill (or give up) the entry
+                    if key not in owned:
+                        _send(self.request, _DENIED)
+                        continue
+                    if op == _PUT:
+                        store.put(key, payload)
+                    else:
+                        store.release(key)
+                    owned.discard(key)
+                    _send(self.request, _OK)
+                elif op == _STATS:
+                    _send(self.request, _OK, payload=json.dumps(store.stats()).encode('utf-8'))
+                else:
+                    return
+        finally:
+            # a client which got a miss and went away must not keep the others waiting
+            for key in owned:
+                store.release(key)
+
+
+class _store(object):
+    """LRU store of encoded responses with a memory budget and coalesced misses."""
+
+    #: seconds a client waits for the response of another client, before requesting it on its own
+    pendingTimeout = 60.0
+
+    def __init__(self, maxBytes):
+        self.maxBytes = maxBytes
+        self._lru = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = collections.Counter()
+
+    def lookup(self, key):
+        """Returns the blob or *None*; in the latter case the caller has to :meth:`put` or :meth:`release` it."""
+        waited = timedOut = False
+        while True:
+            with self._lock:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    self._stats['coalesced' if waited else 'hits'] += 1
+                    return self._lru[key]
+                event = self._pending.get(key)
+                if event is None or timedOut:
+                    # the owner failed (or is too slow), so the caller becomes the new owner
+                    self._pending[key] = threading.Event()
+                    self._stats['misses'] += 1
+                    return None
+            timedOut = not event.wait(self.pendingTimeout)
+            waited = True
+
+    def put(self, key, blob):
+        with self._lock:
+            if key in self._lru:
+                self._bytes -= len(self._lru.pop(key))
+            self._lru[key] = blob
+            self._bytes += len(blob)
+            while self._bytes > self.maxBytes and len(self._lru) > 1:
+                self._bytes -= len(self._lru.popitem(last=False)[1])
+                self._stats['evictions'] += 1
+        self.release(key)
+
+    def release(self, key):
+        with self._lock:
+            event = self._pending.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            out = dict(entries=len(self._lru), bytes=self._bytes, maxBytes=self.maxBytes, pending=len(self._pending))
+            for k in ('hits', 'coalesced', 'misses', 'evictions'):
+                out[k] = self._stats[k]
+        return out
+
+
+class cacheServer(socketserver.ThreadingMixIn, socketserver.BaseServer):
+    """
+    Daemon of the shared cache, serving one thread per connected client.
+    A Unix socket is created with mode 0600 (and its folder with mode 0700, if it doesn't exist).
+
+    :param address: path of a Unix socket or ``host:port`` (see :func:`parseAddress`)
+    :type address: str
+    :param maxBytes: memory budget for the (compressed) responses in bytes
+    :type maxBytes: int
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=defaultAddress, maxBytes=256 * 2**20):
+        self.address_family, addr = parseAddress(address)
+        if self.address_family == socket.AF_UNIX:
+            folder = os.path.dirname(addr)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder, mode=0o700)
+            if os.path.exists(addr):
+                os.remove(addr)
+        socketserver.BaseServer.__init__(self, addr, _handler)
+        self.socket = socket.socket(self.address_family, socket.SOCK_STREAM)
+        if self.address_family == socket.AF_INET:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(addr)
+        else:
+            # no other user may connect, not even between bind and chmod
+            umask = os.umask(0o177)
+            try:
+                self.socket.bind(addr)
+            finally:
+                os.umask(umask)
+            os.chmod(addr, 0o600)
+        self.server_address = self.socket.getsockname()
+        self.socket.listen(64)
+        self.store = _store(maxBytes)
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    def get_request(self):
+        return self.socket.accept()
+
+    def shutdown_request(self, request):
+        try:
+            request.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        request.close()
+
+    def server_close(self):
+        self.socket.close()
+        if self.address_family == socket.AF_UNIX and os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+class cacheClient(object):
+    """
+    Client of a :class:`cacheServer`, to be assigned to :attr:`pyilt2.web.requestScheduler.shared`.
+    Each thread uses its own connection.
+
+    :param address: path of a Unix socket or ``host:port`` (see :func:`parseAddress`)
+    :type address: str
+    :param timeout: socket timeout in seconds
+    :type timeout: float
+    """
+
+    #: seconds to wait before trying to reconnect to an unreachable daemon
+    retryDelay = 30.0
+
+    def __init__(self, address=defaultAddress, timeout=120.0):
+        self.family, self.address = parseAddress(address)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._downUntil = 0.0
+        self._stats = collections.Counter()
+
+    def _sock(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is None:
+            sock = socket.socket(self.family, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.address)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _call(self, op, key=b'', payload=b''):
+        if time.monotonic() < self._downUntil:
+            raise OSError('shared cache unreachable')
+        try:
+            sock = self._sock()
+            _send(sock, op, key, payload)
+            return _recv(sock)
+        except (OSError, EOFError, struct.error):
+            self.close()
+            self._downUntil = time.monotonic() + self.retryDelay
+            raise OSError('shared cache unreachable')
+
+    def _count(self, k):
+        with self._lock:
+            self._stats[k] += 1
+
+    def fetch(self, key, send):
+        """
+        Returns the response for *key* from the daemon or requests it by ``send()`` and shares it.
+        Only responses with status 200 are shared;
+        a shared response has the additional attribute ``fromShared = True``.
+
+        :param key: cache key of the request, see :meth:`pyilt2.web.responseCache.key`
+        :type key: str
+        :param send: callable which sends the request and returns the :class:`requests.Response`
+        :rtype: :class:`requests.Response`
+        """
+        key = key.encode('ascii')
+        try:
+            op, _, blob = self._call(_GET, key)
+        except OSError:
+            self._count('unreachable')
+            return send()
+        if op == _HIT:
+            self._count('hits')
+            r = decodeResponse(blob)
+            r.fromShared = True
+            return r
+        self._count('misses')
+        # we got the miss, so the other processes wait for us
+        try:
+            r = send()
+        except Exception:
+            self._release(key)
+            raise
+        if r.status_code == 200:
+            try:
+                self._call(_PUT, key, encodeResponse(r))
+            except OSError:
+                pass
+        else:
+            self._release(key)
+        return r
+
+    def _release(self, key):
+        try:
+            self._call(_RELEASE, key)
+        except OSError:
+            pass
+
+    def stats(self):
+        """
+        Returns the statistics of this client and (as ``'server'``) of the daemon, like::
+
+            {'hits': 950, 'misses': 50, 'unreachable': 0,
+             'server': {'entries': 1200, 'bytes': 8388608, 'maxBytes': 268435456, 'pending': 0,
+                        'hits': 30000, 'coalesced': 42, 'misses': 1200, 'evictions': 0}}
+
+        ``'server'`` is *None* if the daemon is unreachable.
+
+        :rtype: dict
+        """
+        with self._lock:
+            out = dict((k, self._stats[k]) for k in ('hits', 'misses', 'unreachable'))
+        try:
+            out['server'] = json.loads(self._call(_STATS)[2].decode('utf-8'))
+        except OSError:
+            out['server'] = None
+        return out
+
+    def close(self):
+        """Closes the connection of the current thread."""
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            self._local.sock = None
+            sock.close()
+
+
+def run():
+    """Starts the daemon (console script ``pyilt2cache``)."""
+    parser = argparse.ArgumentParser(description='Shared cache daemon for pyilt2 processes.')
+    parser.add_argument('address', type=str, nargs='?', default=defaultAddress,
+                        help='path of a Unix socket (mode 0600) or host:port (accessible by all users '
+                             'of the machine). Default: ' + defaultAddress)
+    parser.add_argument('--max-mb', type=int, metavar='256', default=256,
+                        help='memory budget for the compressed responses in MB. Default: 256')
+    args = parser.parse_args()
+    server = cacheServer(args.address, maxBytes=args.max_mb * 2**20)
+    # remove the socket file also if stopped by the process manager
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print('pyilt2cache listening on {0:s}'.format(os.path.expanduser(args.address)))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""
+Property surfaces
+
+A :class:`surface` is a polynomial fit of a physical property over temperature and pressure,
+like the density of a pure ionic liquid :math:`\\rho(T, P)`, built from the data of one or more
+:class:`pyilt2.dataset` objects. All values are in SI units (see :mod:`pyilt2.units`).
+Once fitted, a surface evaluates arrays of millions of points in a single vectorized call:
+
+.. code-block:: py
+
+    from pyilt2 import surface
+
+    surf = surface.fitSurface(dataSets, prop='dens')
+    rho = surf(T=np.linspace(280, 360, 10**6), P=101325.)
+
+:func:`fitSurface` keeps the fitted surfaces per (component set, property) in memory.
+If a :class:`pyilt2.web.responseCache` is assigned to :data:`pyilt2.web.scheduler`,
+their coefficients also persist in the file :data:`cacheFileName` of its folder,
+next to the cached responses of the data sets, and are loaded from there by the next process:
+
+.. code-block:: py
+
+    web.scheduler.cache = web.responseCache('~/.cache/pyilt2')
+    surf = surface.fitSurface(dataSets, prop='dens')   # fitted once, later read from ~/.cache/pyilt2/surfaces.json
+
+:func:`saveSurfaces` and :func:`loadSurfaces` store and read the coefficients of all cached surfaces
+in any other JSON file.
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import json
+import os
+import threading
+
+import numpy as np
+from numpy.polynomial import polynomial
+
+from . import units, web
+from .units import compositionColumns
+
+#: file name of the persisted surfaces in the folder of :attr:`pyilt2.web.requestScheduler.cache`
+cacheFileName = 'surfaces.json'
+
+_surfaces = {}
+# persisted files already read into _surfaces
+_loaded = set()
+_lock = threading.Lock()
+
+
+class surfaceError(Exception):
+    """Exception if a surface can't be fitted from the given data sets."""
+
+    def __init__(self, note):
+        self.msg = note
+
+    def __str__(self):
+        return repr(self.msg)
+
+
+def _column(dataSet, name):
+    """Returns the column (in SI units) with the canonical name, or *None*."""
+    canon = dataSet.canonProps
+    if name not in canon:
+        return None
+    i = canon.index(name)
+    factors, offsets, siUnits = units.siPlan(dataSet.physProps, dataSet.physUnits)
+    return dataSet.data[:, i] * factors[i] + offsets[i], siUnits[i]
+
+
+def _propColumn(dataSet):
+    """Returns the canonical name of the first column which is neither T, P, a composition nor an uncertainty."""
+    for name in dataSet.canonProps:
+        if name not in ('T', 'P') and name not in compositionColumns and not name.startswith('Delta['):
+            return name
+    return None
+
+
+def _defaultProp(dataSets, prop):
+    if not dataSets:
+        raise surfaceError('No data sets to fit!')
+    prop = prop or _propColumn(dataSets[0])
+    if prop is None:
+        raise surfaceError('Data set "{0:s}" has no property column!'.format(dataSets[0].setid))
+    return prop
+
+
+def _cacheFile():
+    """Returns the path of the persisted surfaces, or *None* if there is no response cache."""
+    cache = web.scheduler.cache
+    if cache is None:
+        return None
+    return os.path.join(cache.dirname, cacheFileName)
+
+
+class surface(object):
+    """
+    Polynomial surface of a physical property over temperature (and pressure):
+
+    .. math::
+
+        y(T, P) = \\sum_{i=0}^{degT} \\sum_{j=0}^{degP} c_{ij} \\, t^i p^j, \\quad
+        t = (T - T_0) / T_s, \\quad p = (P - P_0) / P_s
+
+    The variables are centered and scaled to the range of the data to keep the fit well-conditioned.
+    Surfaces are created by :func:`fitSurface` or :meth:`fromDict`.
+
+    :param components: names of the components
+    :type components: tuple
+    :param prop: canonical name of the property (see :func:`pyilt2.units.canonicalProp`)
+    :type prop: str
+    :param unit: SI unit of the property
+    :type unit: str
+    :param coef: coefficients :math:`c_{ij}` with shape ``(degT+1, degP+1)``
+    :type coef: :class:`numpy.ndarray`
+    :param scale: ``(T0, Ts, P0, Ps)``
+    :type scale: tuple
+    """
+
+    def __init__(self, components, prop, unit, coef, scale, setids=(), order=None,
+                 Trange=None, Prange=None, rms=None):
+        #: names of the components
+        self.components = tuple(components)
+        #: canonical name of the property
+        self.prop = prop
+        #: SI unit of the property
+        self.unit = unit
+        #: coefficients with shape ``(degT+1, degP+1)``
+        self.coef = np.asarray(coef, dtype=float)
+        #: ``(T0, Ts, P0, Ps)``
+        self.scale = tuple(scale)
+        #: setids of the fitted data sets
+        self.setids = tuple(setids)
+        #: requested degrees ``(degT, degP)`` of the fit (the actual ones may be lower for sparse data)
+        self.order = tuple(order) if order else (self.coef.shape[0] - 1, self.coef.shape[1] - 1)
+        #: temperature range of the fitted data
+        self.Trange = Trange
+        #: pressure range of the fitted data (*None* if no pressure column)
+        self.Prange = Prange
+        #: root mean square deviation of the fit
+        self.rms = rms
+
+    def __call__(self, T, P=101325.):
+        """
+        Evaluates the surface. *T* and *P* may be scalars or arrays (broadcast against each other).
+
+        :param T: temperature in K
+        :param P: pressure in Pa (ignored if the surface has no pressure dependence)
+        :return: property values in :attr:`unit`
+        :rtype: :class:`numpy.ndarray`
+        """
+        T0, Ts, P0, Ps = self.scale
+        t = (np.asarray(T, dtype=float) - T0) / Ts
+        p = (np.asarray(P, dtype=float) - P0) / Ps
+        t, p = np.broadcast_arrays(t, p)
+        return polynomial.polyval2d(t, p, self.coef)
+
+    @property
+    def degT(self):
+        """Polynomial degree in temperature."""
+        return self.coef.shape[0] - 1
+
+    @property
+    def degP(self):
+        """Polynomial degree in pressure."""
+        return self.coef.shape[1] - 1
+
+    def toDict(self):
+        """Returns the surface as JSON serializable dict."""
+        return dict(components=list(self.components), prop=self.prop, unit=self.unit,
+                    coef=self.coef.tolist(), scale=list(self.scale), setids=list(self.setids),
+                    order=list(self.order), Trange=self.Trange, Prange=self.Prange, rms=self.rms)
+
+    @classmethod
+    def fromDict(cls, d):
+        """Creates a surface from a dict as returned by :meth:`toDict`."""
+        return cls(**d)
+
+
+def fit(dataSets, prop=None, degT=2, degP=1):
+    """
+    Fits a :class:`surface` to the data of one or more data sets of the same component(s) by linear least squares.
+    The degrees are reduced if there are too few distinct temperatures (pressures) in the data.
+
+    :param dataSets: data sets
+    :type dataSets: list of :class:`pyilt2.dataset`
+    :param prop: canonical name of the property column (default: the first property column of the first data set)
+    :type prop: str
+    :param degT: polynomial degree in temperature
+    :type degT: int
+    :param degP: polynomial degree in pressure
+    :type degP: int
+    :return: fitted surface
+    :rtype: :class:`surface`
+    :raises pyilt2.surface.surfaceError: if the data sets can't be fitted
+    """
+    prop = _defaultProp(dataSets, prop)
+    order = (degT, degP)
+    Ts, Ps, Ys = [], [], []
+    unit = None
+    hasP = True
+    for ds in dataSets:
+        if any(c in compositionColumns for c in ds.canonProps):
+            raise surfaceError('Data set "{0:s}" has composition columns!'.format(ds.setid))
+        tcol = _column(ds, 'T')
+        ycol = _column(ds, prop)
+        if tcol is None or ycol is None:
+            raise surfaceError('Data set "{0:s}" has no T or "{1:s}" column!'.format(ds.setid, prop))
+        if unit and ycol[1] != unit:
+            raise surfaceError('Data set "{0:s}" has incompatible units "{1:s}"!'.format(ds.setid, str(ycol[1])))
+        unit = ycol[1]
+        pcol = _column(ds, 'P')
+        hasP = hasP and pcol is not None
+        Ts.append(tcol[0])
+        Ys.append(ycol[0])
+        Ps.append(pcol[0] if pcol is not None else np.full(len(ds.data), np.nan))
+    T = np.concatenate(Ts)
+    Y = np.concatenate(Ys)
+    if hasP:
+        P = np.concatenate(Ps)
+    else:
+        P = np.zeros_like(T)
+        degP = 0
+    degT = min(degT, len(np.unique(T)) - 1)
+    degP = min(degP, len(np.unique(P)) - 1)
+    T0, P0 = T.mean(), P.mean()
+    Tsc = T.std() or 1.0
+    Psc = P.std() or 1.0
+    A = polynomial.polyvander2d((T - T0) / Tsc, (P - P0) / Psc, [degT, degP])
+    coef, _, _, _ = np.linalg.lstsq(A, Y, rcond=None)
+    coef = coef.reshape(degT + 1, degP + 1)
+    rms = float(np.sqrt(np.mean((A.dot(coef.ravel()) - Y) ** 2)))
+    return surface(dataSets[0].listOfComp, prop, unit, coef, (T0, Tsc, P0, Psc),
+                   setids=[ds.setid for ds in dataSets], order=order,
+                   Trange=(float(T.min()), float(T.max())),
+                   Prange=(float(P.min()), float(P.max())) if hasP else None,
+                   rms=rms)
+
+
+def fitSurface(dataSets, prop=None, degT=2, degP=1):
+    """
+    Like :func:`fit`, but the surface is cached per (component set, property) and only refitted,
+    if the data sets (setids) or requested degrees differ from the cached one.
+    With a response cache (see :attr:`pyilt2.web.requestScheduler.cache`) the surfaces persist in its folder.
+
+    :rtype: :class:`surface`
+    """
+    prop = _defaultProp(dataSets, prop)
+    key = (frozenset(dataSets[0].listOfComp), prop)
+    setids = tuple(ds.setid for ds in dataSets)
+    path = _cacheFile()
+    with _lock:
+        load = path is not None and path not in _loaded
+        _loaded.add(path)
+    if load and os.path.isfile(path):
+        try:
+            loadSurfaces(path)
+        except (IOError, ValueError, TypeError):
+            # a damaged file is replaced by the next save
+            pass
+    with _lock:
+        surf = _surfaces.get(key)
+    if surf is None or surf.setids != setids or surf.order != (degT, degP):
+        surf = fit(dataSets, prop=prop, degT=degT, degP=degP)
+        with _lock:
+            _surfaces[key] = surf
+        if path is not None:
+            saveSurfaces(path)
+    return surf
+
+
+def fitSurfaces(dataSets, degT=2, degP=1):
+    """
+    Groups data sets by (component set, property) and fits a surface for each group.
+    Data sets which can't be fitted (e.g. mixtures with composition columns) are left out.
+
+    :param dataSets: data sets
+    :type dataSets: list of :class:`pyilt2.dataset`
+    :return: dict with ``(frozenset of components, prop)`` as *key* and :class:`surface` as *value*
+    :rtype: dict
+    """
+    groups = {}
+    for ds in dataSets:
+        prop = _propColumn(ds)
+        if prop is None or any(c in compositionColumns for c in ds.canonProps):
+            continue
+        groups.setdefault((frozenset(ds.listOfComp), prop), []).append(ds)
+    out = {}
+    for key, group in groups.items():
+        try:
+            out[key] = fitSurface(group, prop=key[1], degT=degT, degP=degP)
+        except surfaceError:
+            pass
+    return out
+
+
+def getSurface(components, prop):
+    """
+    Returns the cached surface for a component set and property or *None*.
+
+    :param components: names of the components
+    :type components: list
+    :param prop: canonical name of the property
+    :type prop: str
+    :rtype: :class:`surface`
+    """
+    with _lock:
+        return _surfaces.get((frozenset(components), prop))
+
+
+def saveSurfaces(filename):
+    """
+    Writes all cached surfaces to a JSON file.
+
+    :param filename: file name
+    :type filename: str
+    """
+    with _lock:
+        out = [surf.toDict() for surf in _surfaces.values()]
+    tmp = '{0:s}.{1:d}.{2:d}.tmp'.format(filename, os.getpid(), threading.current_thread().ident)
+    with open(tmp, 'w') as fp:
+        json.dump(out, fp)
+    os.replace(tmp, filename)
+
+
+def loadSurfaces(filename):
+    """
+    Reads surfaces from a JSON file (as written by :func:`saveSurfaces`) into the cache.
+
+    :param filename: file name
+    :type filename: str
+    :return: number of surfaces read
+    :rtype: int
+    """
+    with open(filename) as fp:
+        surfs = [surface.fromDict(d) for d in json.load(fp)]
+    with _lock:
+        for surf in surfs:
+            _surfaces[(frozenset(surf.components), surf.prop)] = surf
+    return len(surfs)
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Physical units and canonical names of data columns
+
+The NIST data sets keep the units as published, like ``kPa`` or ``MPa`` for pressure.
+This module provides a conversion table to SI units and canonical short names for the data columns,
+which are used by :meth:`pyilt2.dataset.toSI` and :attr:`pyilt2.dataset.canonProps`.
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import functools
+
+import numpy as np
+
+from .proplist import prop2abr
+
+#: conversion of a unit (as in the data header) to SI by ``(SI unit, factor, offset)``, where
+#: ``value_SI = value * factor + offset``
+unit2si = {
+    # temperature
+    'K': ('K', 1.0, 0.0),
+    'mK': ('K', 1e-3, 0.0),
+    'C': ('K', 1.0, 273.15),
+    '°C': ('K', 1.0, 273.15),
+    # pressure
+    'Pa': ('Pa', 1.0, 0.0),
+    'hPa': ('Pa', 1e2, 0.0),
+    'kPa': ('Pa', 1e3, 0.0),
+    'MPa': ('Pa', 1e6, 0.0),
+    'GPa': ('Pa', 1e9, 0.0),
+    'bar': ('Pa', 1e5, 0.0),
+    'mbar': ('Pa', 1e2, 0.0),
+    'atm': ('Pa', 101325.0, 0.0),
+    'Pa/mol/kg': ('Pa*kg/mol', 1.0, 0.0),
+    'kPa/mol/kg': ('Pa*kg/mol', 1e3, 0.0),
+    'MPa/mol/kg': ('Pa*kg/mol', 1e6, 0.0),
+    '1/kPa': ('1/Pa', 1e-3, 0.0),
+    '1/MPa': ('1/Pa', 1e-6, 0.0),
+    '1/GPa': ('1/Pa', 1e-9, 0.0),
+    '1/Pa': ('1/Pa', 1.0, 0.0),
+    'TPa-1': ('1/Pa', 1e-12, 0.0),
+    # density & volume
+    'kg/m3': ('kg/m3', 1.0, 0.0),
+    'g/cm3': ('kg/m3', 1e3, 0.0),
+    'g/ml': ('kg/m3', 1e3, 0.0),
+    'm3/mol': ('m3/mol', 1.0, 0.0),
+    'cm3/mol': ('m3/mol', 1e-6, 0.0),
+    'm3/kg': ('m3/kg', 1.0, 0.0),
+    # viscosity
+    'Pa*s': ('Pa*s', 1.0, 0.0),
+    'mPa*s': ('Pa*s', 1e-3, 0.0),
+    'cP': ('Pa*s', 1e-3, 0.0),
+    'P': ('Pa*s', 0.1, 0.0),
+    # energy
+    'J/mol': ('J/mol', 1.0, 0.0),
+    'kJ/mol': ('J/mol', 1e3, 0.0),
+    'J/kg': ('J/kg', 1.0, 0.0),
+    'kJ/kg': ('J/kg', 1e3, 0.0),
+    'J/K/mol': ('J/K/mol', 1.0, 0.0),
+    'J/mol/K': ('J/K/mol', 1.0, 0.0),
+    'kJ/K/mol': ('J/K/mol', 1e3, 0.0),
+    'J/K/kg': ('J/K/kg', 1.0, 0.0),
+    'J/kg/K': ('J/K/kg', 1.0, 0.0),
+    'J/K/g': ('J/K/kg', 1e3, 0.0),
+    'J/g/K': ('J/K/kg', 1e3, 0.0),
+    # transport
+    'S/m': ('S/m', 1.0, 0.0),
+    'mS/cm': ('S/m', 0.1, 0.0),
+    'S/cm': ('S/m', 1e2, 0.0),
+    'W/m/K': ('W/m/K', 1.0, 0.0),
+    'mW/m/K': ('W/m/K', 1e-3, 0.0),
+    'm2/s': ('m2/s', 1.0, 0.0),
+    'cm2/s': ('m2/s', 1e-4, 0.0),
+    'mm2/s': ('m2/s', 1e-6, 0.0),
+    'm/s': ('m/s', 1.0, 0.0),
+    # interfacial tension
+    'N/m': ('N/m', 1.0, 0.0),
+    'mN/m': ('N/m', 1e-3, 0.0),
+    # composition
+    'mol/kg': ('mol/kg', 1.0, 0.0),
+    'mol/m3': ('mol/m3', 1.0, 0.0),
+    'mol/dm3': ('mol/m3', 1e3, 0.0),
+    'mol/l': ('mol/m3', 1e3, 0.0),
+    '1/K': ('1/K', 1.0, 0.0),
+    'kK-1': ('1/K', 1e-3, 0.0),
+}
+
+#: canonical names of data columns which are not a physical property of :data:`pyilt2.prop2abr`
+column2canon = {
+    'Temperature': 'T',
+    'Pressure': 'P',
+    'Specific density': 'dens',
+    'Specific volume': 'vol',
+    'Molar volume': 'Vm',
+    'Mole fraction': 'x',
+    'Mass fraction': 'w',
+    'Volume fraction': 'phi_v',
+    'Molality': 'm',
+    'Molarity': 'c',
+}
+
+#: canonical names of composition columns (one per component of a mixture)
+compositionColumns = ('x', 'w', 'phi_v', 'm', 'c')
+
+# spellings of the multiplication sign in the units of the data header
+_mulSigns = ('&#8226;', '&middot;', '·', '•', '.', ' ')
+
+
+def _unitKey(unit):
+    for sign in _mulSigns:
+        unit = unit.replace(sign, '*')
+    return unit.replace('<SUB>', '').replace('</SUB>', '').replace('**', '*').strip('*')
+
+
+@functools.lru_cache(maxsize=None)
+def canonicalProp(prop):
+    """
+    Returns the canonical short name of a data column, as found in :attr:`pyilt2.dataset.physProps`.
+    Columns of physical properties get the abbreviation of :data:`pyilt2.prop2abr`,
+    others (like ``Temperature`` or ``Mole_fraction_of_water``) those of :data:`column2canon`.
+    Uncertainty columns ``Delta[...]`` keep their form, like ``Delta[T]``.
+    If no canonical name is known, the name is returned unchanged.
+
+    :param prop: column name
+    :type prop: str
+    :return: canonical name
+    :rtype: str
+    """
+    if prop.startswith('Delta[') and prop.endswith(']'):
+        return 'Delta[{0:s}]'.format(canonicalProp(prop[6:-1]))
+    name = prop.replace('_', ' ').strip()
+    if name in prop2abr:
+        return prop2abr[name]
+    for key in column2canon:
+        if name == key or name.startswith(key + ' '):
+            return column2canon[key]
+    return prop
+
+
+@functools.lru_cache(maxsize=None)
+def conversion(prop, unit):
+    """
+    Looks up the conversion to SI for a data column.
+    The results are cached per ``(prop, unit)``, so repeated headers cost a single dict lookup.
+
+    :param prop: column name, as found in :attr:`pyilt2.dataset.physProps`
+    :type prop: str
+    :param unit: unit, as found in :attr:`pyilt2.dataset.physUnits`
+    :type unit: str
+    :return: ``(SI unit, factor, offset)`` or *None* if the unit is unknown or the column has no unit
+    :rtype: tuple
+    """
+    if not unit:
+        return None
+    conv = unit2si.get(_unitKey(unit))
+    if conv and prop.startswith('Delta['):
+        # uncertainties are differences, so no offset
+        conv = (conv[0], conv[1], 0.0)
+    return conv
+
+
+@functools.lru_cache(maxsize=1024)
+def siPlan(physProps, physUnits):
+    """
+    Builds the conversion plan for a data header, which is cached per distinct header signature.
+
+    :param physProps: column names
+    :type physProps: tuple
+    :param physUnits: units of the columns
+    :type physUnits: tuple
+    :return: ``(factors, offsets, siUnits)``, where *factors* and *offsets* are read-only
+             :class:`numpy.ndarray` to apply on the data rows and *siUnits* is a tuple of the new units
+    :rtype: tuple
+    """
+    factors = np.ones(len(physProps))
+    offsets = np.zeros(len(physProps))
+    siUnits = []
+    for i in range(0, len(physProps)):
+        conv = conversion(physProps[i], physUnits[i])
+        if conv:
+            siUnits.append(conv[0])
+            factors[i] = conv[1]
+            offsets[i] = conv[2]
+        else:
+            siUnits.append(physUnits[i])
+    factors.flags.writeable = False
+    offsets.flags.writeable = False
+    return factors, offsets, tuple(siUnits)
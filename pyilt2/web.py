@@ -0,0 +1,453 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP layer
+
+All requests of pyilt2 (:func:`pyilt2.query`, :class:`pyilt2.dataset`, the property list
+and :func:`pyilt2.report.citation2doi`) go through :func:`get`, which hands them to the :data:`scheduler`.
+It keeps the traffic to each host within a rate limit (token bucket), serves *interactive* requests
+before *bulk* requests, shares the bandwidth fairly between concurrent *flows* (like jobs of a batch),
+and slows down if a server returns errors or answers slowly.
+
+Responses are requested compressed (gzip, deflate and - if the *brotli* package is installed - br).
+With a :class:`responseCache` assigned to the scheduler, responses are stored locally and
+later requests for the same URL are sent as conditional requests (``If-None-Match``, ``If-Modified-Since``),
+so unchanged responses are served from the local copy after a cheap revalidation:
+
+.. code-block:: py
+
+    web.scheduler.cache = web.responseCache('~/.cache/pyilt2')
+
+Several processes share their responses by a daemon of :mod:`pyilt2.sharedcache`
+(see :attr:`requestScheduler.shared`). All responses can be recorded to an archive and replayed
+without network by :mod:`pyilt2.replay` (see :attr:`requestScheduler.archive`).
+
+Bulk jobs declare themselves by the :func:`priority` context manager:
+
+.. code-block:: py
+
+    from pyilt2 import web
+
+    with web.priority(web.BULK, flow='mirror'):
+        for ref in res:
+            ref.get()
+
+(c) 2018 Frank Roemer; see http://wgserve.de/pyilt2
+Licensed under the MIT license: http://www.opensource.org/licenses/mit-license.php
+"""
+
+import collections
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import zlib
+
+import requests
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+try:
+    import brotli  # noqa: F401 (urllib3 decodes 'br' if available)
+    _encodings = 'gzip, deflate, br'
+except ImportError:
+    _encodings = 'gzip, deflate'
+
+#: priority class for requests a user waits for
+INTERACTIVE = 0
+#: priority class for bulk downloads
+BULK = 1
+
+#: number of connections per host kept by the pool of :data:`session` (see :func:`setPoolSize`)
+poolSize = 16
+
+#: shared :class:`requests.Session`, so that consecutive (or concurrent) requests reuse the connection pool
+session = requests.Session()
+session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=poolSize))
+session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=poolSize))
+session.headers['Accept-Encoding'] = _encodings
+
+_poolLock = threading.Lock()
+
+
+def setPoolSize(size):
+    """
+    Grows the connection pool of :data:`session` to keep (at least) *size* connections per host,
+    so that as many concurrent requests (like workers of a thread pool) don't discard their connections.
+    The pool never shrinks.
+
+    :param size: number of connections per host
+    :type size: int
+    """
+    global poolSize
+    with _poolLock:
+        if size <= poolSize:
+            return
+        poolSize = size
+        session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=size))
+        session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=size))
+
+#: rate limits per host as ``(requests per second, burst)``
+hostRates = {
+    'ilthermo.boulder.nist.gov': (5.0, 5),
+    'api.crossref.org': (10.0, 10),
+}
+#: rate limit for hosts not listed in :data:`hostRates`
+defaultRate = (5.0, 5)
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def priority(cls, flow=None):
+    """
+    Context manager to set the priority class (and flow) for all requests made by the current thread.
+
+    :param cls: :data:`INTERACTIVE` or :data:`BULK`
+    :type cls: int
+    :param flow: name of the flow, requests of different flows within a priority class are served round-robin
+    :type flow: str
+    """
+    old = getattr(_local, 'prio', None)
+    _local.prio = (cls, flow if flow is not None else old[1] if old else 'default')
+    try:
+        yield
+    finally:
+        _local.prio = old
+
+
+def currentPriority():
+    """
+    Returns the priority class and flow of the current thread as set by :func:`priority`,
+    e.g. to pass it on to worker threads.
+
+    :return: ``(cls, flow)``
+    :rtype: tuple
+    """
+    return getattr(_local, 'prio', None) or (INTERACTIVE, 'default')
+
+
+class tokenBucket(object):
+    """
+    Token bucket with an adaptive rate (additive increase, multiplicative decrease).
+
+    :param rate: maximum rate in requests per second
+    :type rate: float
+    :param burst: maximum number of tokens
+    :type burst: int
+    """
+
+    #: lower limit of the rate
+    minRate = 0.2
+    #: responses slower than this (in s) count as a sign of an overloaded server
+    slowLatency = 5.0
+
+    def __init__(self, rate, burst):
+        self.maxRate = float(rate)
+        self.rate = float(rate)
+        self.burst = burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.pauseUntil = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait(self):
+        """Returns the time (in s) until the next token is available, 0 if there is one."""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self.pauseUntil:
+            return self.pauseUntil - now
+        if self.tokens >= 1.0:
+            return 0.0
+        return (1.0 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1.0
+
+    def feedback(self, ok, latency, retryAfter=None):
+        """Adapts the rate to the response of the server."""
+        if ok and latency < self.slowLatency:
+            self.rate = min(self.maxRate, self.rate + 0.1 * self.maxRate)
+        else:
+            self.rate = max(self.minRate, self.rate * 0.5)
+            self.tokens = min(self.tokens, 0.0)
+        if retryAfter:
+            self.pauseUntil = max(self.pauseUntil, time.monotonic() + retryAfter)
+
+
+#: response headers which are kept by :func:`encodeResponse`
+keepHeaders = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def encodeResponse(r):
+    """
+    Encodes a response into a compact form: a zlib compressed JSON header line
+    (status, url, encoding and the headers of :data:`keepHeaders`) followed by the body.
+
+    :param r: response
+    :type r: :class:`requests.Response`
+    :rtype: bytes
+    """
+    head = json.dumps(dict(status=r.status_code, url=r.url, encoding=r.encoding,
+                           headers={k: r.headers[k] for k in keepHeaders if k in r.headers}))
+    return zlib.compress(head.encode('utf-8') + b'\n' + r.content)
+
+
+def decodeResponse(blob):
+    """
+    Decodes a response encoded by :func:`encodeResponse`.
+
+    :rtype: :class:`requests.Response`
+    :raises ValueError: if the blob is damaged
+    """
+    try:
+        head, _, body = zlib.decompress(blob).partition(b'\n')
+        meta = json.loads(head.decode('utf-8'))
+    except (zlib.error, UnicodeDecodeError) as e:
+        raise ValueError(str(e))
+    r = requests.Response()
+    r.status_code = meta.get('status', 200)
+    r._content = body
+    r.headers = requests.structures.CaseInsensitiveDict(meta['headers'])
+    r.url = meta['url']
+    r.encoding = meta['encoding']
+    return r
+
+
+class responseCache(object):
+    """
+    On-disk cache of responses for conditional requests.
+    Only responses with a validator (``ETag`` or ``Last-Modified`` header) are stored,
+    each as a single file encoded by :func:`encodeResponse`, which is replaced atomically.
+
+    :param dirname: cache folder (created if missing)
+    :type dirname: str
+    """
+
+    def __init__(self, dirname):
+        self.dirname = os.path.expanduser(dirname)
+        if not os.path.isdir(self.dirname):
+            os.makedirs(self.dirname)
+
+    @staticmethod
+    def key(url, params=None):
+        """Returns the cache key of a request."""
+        if params:
+            url = url + '?' + urlencode(sorted(params.items()))
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.dirname, key + '.resp')
+
+    def load(self, url, params=None):
+        """
+        Returns the local copy as :class:`requests.Response`, or *None*.
+        The response has the additional attribute ``fromCache = True``.
+        """
+        try:
+            with open(self._path(self.key(url, params)), 'rb') as fp:
+                r = decodeResponse(fp.read())
+        except (IOError, ValueError, KeyError):
+            return None
+        r.fromCache = True
+        return r
+
+    def store(self, url, params, r):
+        """Stores a response, if it has a validator."""
+        if 'ETag' not in r.headers and 'Last-Modified' not in r.headers:
+            return
+        # validators and body in one file, so a concurrent load never mixes old and new
+        path = self._path(self.key(url, params))
+        tmp = '{0:s}.{1:d}.{2:d}.tmp'.format(path, os.getpid(), threading.current_thread().ident)
+        with open(tmp, 'wb') as fp:
+            fp.write(encodeResponse(r))
+        os.replace(tmp, path)
+
+
+class _hostQueue(object):
+
+    def __init__(self, rate, burst):
+        self.bucket = tokenBucket(rate, burst)
+        self.cond = threading.Condition()
+        # priority class -> flow -> deque of tickets
+        self.queues = collections.defaultdict(collections.OrderedDict)
+        # requests, bytes over the wire and responses served from the local copy
+        self.counts = collections.Counter()
+
+    def head(self):
+        for cls in sorted(self.queues):
+            flows = self.queues[cls]
+            if flows:
+                return cls, next(iter(flows))
+        return None
+
+
+class requestScheduler(object):
+    """
+    Rate-limited, priority-aware request scheduler.
+
+    :param session: session used for the requests
+    :type session: :class:`requests.Session`
+    """
+
+    def __init__(self, session):
+        self.session = session
+        #: optional :class:`responseCache` for conditional requests
+        self.cache = None
+        #: optional :class:`pyilt2.sharedcache.cacheClient`, to share responses with other processes
+        self.shared = None
+        #: optional :class:`pyilt2.replay.responseArchive`, to record responses or replay them without network
+        self.archive = None
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._tickets = itertools.count()
+
+    def _host(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = _hostQueue(*hostRates.get(host, defaultRate))
+            return self._hosts[host]
+
+    def setRate(self, host, rate, burst=None):
+        """
+        Sets the (maximum) rate limit of a host.
+
+        :param host: host name, like ``'ilthermo.boulder.nist.gov'``
+        :type host: str
+        :param rate: requests per second
+        :type rate: float
+        :param burst: maximum number of requests at once (default: *rate*)
+        :type burst: int
+        """
+        hostRates[host] = (float(rate), burst or max(1, int(rate)))
+        hq = self._host(host)
+        with hq.cond:
+            hq.bucket = tokenBucket(*hostRates[host])
+
+    def _acquire(self, hq, cls, flow):
+        ticket = next(self._tickets)
+        with hq.cond:
+            flows = hq.queues[cls]
+            flows.setdefault(flow, collections.deque()).append(ticket)
+            try:
+                while True:
+                    if hq.head() == (cls, flow) and flows[flow][0] == ticket:
+                        delay = hq.bucket.wait()
+                        if delay == 0.0:
+                            hq.bucket.take()
+                            return
+                        hq.cond.wait(delay)
+                    else:
+                        hq.cond.wait()
+            finally:
+                # leave the queue (also if interrupted while waiting)
+                flows[flow].remove(ticket)
+                if not flows[flow]:
+                    del flows[flow]
+                else:
+                    # round-robin: this flow goes to the end of the line
+                    flows.move_to_end(flow)
+                hq.cond.notify_all()
+
+    def get(self, url, params=None, **kwargs):
+        """
+        Sends a GET request as soon as the rate limit of the host and the queue allow it.
+        The priority class and flow are taken from :func:`priority` (default: :data:`INTERACTIVE`).
+
+        :param url: URL
+        :type url: str
+        :param params: query parameters
+        :type params: dict
+        :param kwargs: further arguments of :meth:`requests.Session.get`
+        :return: response
+        :rtype: :class:`requests.Response`
+        """
+        archive = self.archive
+        if archive is not None:
+            return archive.fetch(responseCache.key(url, params), lambda: self._sendShared(url, params, **kwargs))
+        return self._sendShared(url, params, **kwargs)
+
+    def _sendShared(self, url, params=None, **kwargs):
+        shared = self.shared
+        if shared is not None:
+            return shared.fetch(responseCache.key(url, params), lambda: self._send(url, params, **kwargs))
+        return self._send(url, params, **kwargs)
+
+    def _send(self, url, params=None, **kwargs):
+        cls, flow = currentPriority()
+        hq = self._host(urlsplit(url).hostname)
+        cache = self.cache
+        local = cache.load(url, params) if cache is not None else None
+        if local is not None:
+            conditional = {}
+            if 'ETag' in local.headers:
+                conditional['If-None-Match'] = local.headers['ETag']
+            if 'Last-Modified' in local.headers:
+                conditional['If-Modified-Since'] = local.headers['Last-Modified']
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **conditional)
+        self._acquire(hq, cls, flow)
+        start = time.monotonic()
+        try:
+            r = self.session.get(url, params=params, **kwargs)
+        except requests.RequestException:
+            with hq.cond:
+                hq.bucket.feedback(False, time.monotonic() - start)
+            raise
+        retryAfter = r.headers.get('Retry-After', '')
+        tell = getattr(getattr(r, 'raw', None), 'tell', None)
+        with hq.cond:
+            hq.bucket.feedback(r.status_code < 500 and r.status_code != 429,
+                               time.monotonic() - start,
+                               float(retryAfter) if retryAfter.isdigit() else None)
+            hq.counts['requests'] += 1
+            hq.counts['bytes'] += tell() if tell else len(r.content)
+        if local is not None and r.status_code == 304:
+            with hq.cond:
+                hq.counts['notModified'] += 1
+            return local
+        if cache is not None and r.status_code == 200:
+            cache.store(url, params, r)
+        return r
+
+    def stats(self):
+        """
+        Returns the current rate, queue length and traffic per host as dict, like::
+
+            {'ilthermo.boulder.nist.gov': {'rate': 5.0, 'maxRate': 5.0, 'queued': 12,
+                                           'requests': 120, 'bytes': 1048576, 'notModified': 80}}
+
+        :rtype: dict
+        """
+        out = {}
+        with self._lock:
+            hosts = dict(self._hosts)
+        for host, hq in hosts.items():
+            with hq.cond:
+                queued = sum(len(q) for flows in hq.queues.values() for q in flows.values())
+                out[host] = dict(rate=hq.bucket.rate, maxRate=hq.bucket.maxRate, queued=queued,
+                                 requests=hq.counts['requests'], bytes=hq.counts['bytes'],
+                                 notModified=hq.counts['notModified'])
+        return out
+
+
+#: the :class:`requestScheduler` used by :func:`get`
+scheduler = requestScheduler(session)
+
+
+def get(url, params=None, **kwargs):
+    """
+    Sends a GET request through the :data:`scheduler`, see :meth:`requestScheduler.get`.
+
+    :rtype: :class:`requests.Response`
+    """
+    return scheduler.get(url, params=params, **kwargs)
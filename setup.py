@@ -20,9 +20,11 @@ setup(
     url = "http://wgserve.de/pyilt2",
     packages=['pyilt2'],
     entry_points = {
-        'console_scripts': ['pyilt2report=pyilt2.report:run'],
+        'console_scripts': ['pyilt2report=pyilt2.report:run',
+                            'pyilt2cache=pyilt2.sharedcache:run'],
     },
-    package_data={'': ['README.md', 'LICENSE', 'CHANGELOG','requirements.txt']},
+    package_data={'': ['README.md', 'LICENSE', 'CHANGELOG','requirements.txt'],
+                  'pyilt2': ['name_to_smiles.json']},
     data_files = [('man/man1', ['pyilt2report.1'])],
     include_package_data=True,
     long_description=read('README.md'),
@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""Tests of the structural similarity of :mod:`pyilt2.components`."""
+
+import pytest
+
+from pyilt2 import components
+
+
+def _similarity(a, b):
+    return float(components.tanimoto(components.fingerprint(a)[None], components.fingerprint(b))[0])
+
+
+@pytest.mark.parametrize('spelling', [
+    'CCCC[N+]1=CN(C=C1)C',
+    'CCCCN1C=[N+](C)C=C1',
+    'CN1C=C[N+](CCCC)=C1',
+    'CCCCn1cc[n+](C)c1',
+])
+def test_spellingsOfOneIon(spelling):
+    assert _similarity('CCCCN1C=C[N+](=C1)C', spelling) == 1.0
+
+
+def test_otherIons():
+    bmim = 'CCCCN1C=C[N+](=C1)C'
+    omim = 'CCCCCCCCN1C=C[N+](=C1)C'
+    bmpyr = 'CCCC[N+]1(C)CCCC1'
+    assert _similarity(bmim, omim) < 1.0
+    assert _similarity(bmim, bmpyr) < _similarity(bmim, omim)
+
+
+def test_parseSmiles():
+    elements, bonds = components.parseSmiles('C[N+]1=CN(C)C=C1.[Cl-]')
+    assert elements == ['C', 'N', 'C', 'N', 'C', 'C', 'C', 'Cl']
+    assert len(bonds) == 7
+    with pytest.raises(ValueError):
+        components.parseSmiles('CC(C')
+
+
+def test_similarRanksSameCation():
+    idx = components.componentIndex({
+        '1-butyl-3-methylimidazolium hexafluorophosphate': 'CCCCN1C=C[N+](=C1)C.F[P-](F)(F)(F)(F)F',
+        '1-butyl-3-methylimidazolium trifluoroacetate': 'CCCC[N+]1=CN(C=C1)C.C(=O)(C(F)(F)F)[O-]',
+        '1-octyl-3-methylimidazolium hexafluorophosphate': 'CCCCCCCCN1C=C[N+](=C1)C.F[P-](F)(F)(F)(F)F',
+    })
+    hits = idx.similar(name='1-butyl-3-methylimidazolium hexafluorophosphate', by='cation')
+    assert [name for name, score in hits[:2]] == ['1-butyl-3-methylimidazolium hexafluorophosphate',
+                                                  '1-butyl-3-methylimidazolium trifluoroacetate']
+    assert hits[1][1] == 1.0
+    assert hits[2][1] < 1.0
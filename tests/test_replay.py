@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`pyilt2.replay` against a small local server, which fails the first request of each URL."""
+
+import http.server
+import threading
+
+import pytest
+
+from pyilt2 import replay, web
+
+
+class _handler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        failed = self.server.failed
+        if self.path not in failed and not self.path.endswith('ok'):
+            failed.add(self.path)
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = '{{"path": "{0:s}"}}'.format(self.path).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _handler)
+    server.failed = set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0:d}/'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def scheduler():
+    s = web.requestScheduler(web.session)
+    s.setRate('127.0.0.1', 1000)
+    return s
+
+
+def test_retrySucceeds(url, scheduler, tmpdir):
+    filename = str(tmpdir.join('run.zip'))
+    scheduler.archive = replay.responseArchive(filename, mode='record')
+    assert scheduler.get(url + 'ilset', params={'set': 'S2'}).status_code == 500
+    assert scheduler.get(url + 'ilset', params={'set': 'S2'}).status_code == 200
+    scheduler.archive.close()
+
+    scheduler.archive = replay.responseArchive(filename, mode='replay')
+    r = scheduler.get(url + 'ilset', params={'set': 'S2'})
+    assert r.status_code == 200
+    assert r.fromArchive
+    assert r.json() == {'path': '/ilset?set=S2'}
+    scheduler.archive.close()
+
+
+def test_failureKept(url, scheduler, tmpdir):
+    filename = str(tmpdir.join('run.zip'))
+    scheduler.archive = replay.responseArchive(filename, mode='record')
+    assert scheduler.get(url + 'ilset', params={'set': 'S1'}).status_code == 500
+    assert scheduler.get(url + 'ok').status_code == 200
+    scheduler.archive.close()
+
+    with replay.responseArchive(filename, mode='replay') as archive:
+        assert archive.stats()['entries'] == 2
+        scheduler.archive = archive
+        assert scheduler.get(url + 'ilset', params={'set': 'S1'}).status_code == 500
+        assert scheduler.get(url + 'ok').status_code == 200
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`pyilt2.surface` with synthetic data sets (no network)."""
+
+import os
+
+import numpy as np
+import pytest
+
+import pyilt2
+from pyilt2 import surface, web
+
+
+def _dataSet(setid, dhead, rows):
+    setDict = {'title': 'Density: Density', 'ref': {'title': 'A paper', 'full': 'Muster, M. (2018) J. 1, 1.'},
+               'components': [{'name': '1-butyl-3-methylimidazolium hexafluorophosphate'}],
+               'dhead': dhead, 'data': [[[v] for v in row] for row in rows]}
+    return pyilt2.dataset(setid, setDict=setDict)
+
+
+def _density(setid='S1'):
+    rows = [(T, P, 1500.0 - 0.8 * T + 1e-3 * P) for T in (290.0, 310.0, 330.0, 350.0) for P in (100.0, 1000.0)]
+    return _dataSet(setid, [['Temperature, K'], ['Pressure, kPa'], ['Specific density, kg/m<SUP>3</SUP>', 'Liquid']],
+                    rows)
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    surface._surfaces.clear()
+    surface._loaded.clear()
+    old = web.scheduler.cache
+    yield
+    web.scheduler.cache = old
+    surface._surfaces.clear()
+    surface._loaded.clear()
+
+
+def test_fit():
+    surf = surface.fitSurface([_density()], prop='dens')
+    assert surf.prop == 'dens'
+    assert np.allclose(surf(T=[300.0, 340.0], P=5e5), [1500.0 - 240.0 + 0.5, 1500.0 - 272.0 + 0.5])
+
+
+def test_noPropertyColumn():
+    ds = _dataSet('S2', [['Temperature, K'], ['Pressure, kPa']], [(300.0, 100.0), (310.0, 100.0)])
+    with pytest.raises(surface.surfaceError):
+        surface.fit([ds])
+    with pytest.raises(surface.surfaceError):
+        surface.fitSurface([ds])
+
+
+def test_persistInResponseCache(tmpdir, monkeypatch):
+    web.scheduler.cache = web.responseCache(str(tmpdir))
+    surf = surface.fitSurface([_density()], prop='dens')
+    assert os.path.isfile(str(tmpdir.join(surface.cacheFileName)))
+
+    # a new process starts with an empty memory cache, but doesn't fit again
+    surface._surfaces.clear()
+    surface._loaded.clear()
+    monkeypatch.setattr(surface, 'fit', None)
+    cached = surface.fitSurface([_density()], prop='dens')
+    assert np.allclose(cached.coef, surf.coef)
+    assert surface.getSurface(surf.components, 'dens') is cached
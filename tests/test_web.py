@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Tests of :mod:`pyilt2.web` against a small local server, which sends ETags and gzip compressed bodies."""
+
+import gzip
+import hashlib
+import http.server
+import json
+import os
+import threading
+
+import pytest
+
+from pyilt2 import web
+
+BODY = json.dumps({'res': [['ZqnCF', 'Density', 'Doe, J.', 2018, 'water', 'bmim Cl'] for i in range(200)]}).encode()
+ETAG = '"{0:s}"'.format(hashlib.md5(BODY).hexdigest())
+
+
+class _handler(http.server.BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+        body = gzip.compress(BODY)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', ETAG)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{0:d}/ilsearch'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def scheduler():
+    s = web.requestScheduler(web.session)
+    s.setRate('127.0.0.1', 1000)
+    return s
+
+
+def test_compressed(url, scheduler):
+    r = scheduler.get(url, params={'cmp': 'bmim'})
+    assert r.content == BODY
+    stats = scheduler.stats()['127.0.0.1']
+    assert stats['requests'] == 1
+    assert 0 < stats['bytes'] < len(BODY) / 4
+
+
+def test_conditional(url, scheduler, tmpdir):
+    scheduler.cache = web.responseCache(str(tmpdir))
+    first = scheduler.get(url, params={'cmp': 'bmim'})
+    firstBytes = scheduler.stats()['127.0.0.1']['bytes']
+    second = scheduler.get(url, params={'cmp': 'bmim'})
+    stats = scheduler.stats()['127.0.0.1']
+    assert not getattr(first, 'fromCache', False)
+    assert second.fromCache
+    assert second.content == BODY
+    assert second.headers['ETag'] == ETAG
+    assert stats['requests'] == 2
+    assert stats['notModified'] == 1
+    assert stats['bytes'] - firstBytes < firstBytes
+
+
+def test_cacheSingleFile(url, scheduler, tmpdir):
+    cache = web.responseCache(str(tmpdir))
+    r = scheduler.get(url)
+    cache.store(url, None, r)
+    assert os.listdir(str(tmpdir)) == [cache.key(url) + '.resp']
+    local = cache.load(url)
+    assert local.content == BODY
+    assert local.headers['ETag'] == ETAG
+    assert cache.load(url, {'cmp': 'other'}) is None